@@ -1,23 +1,35 @@
+import asyncio
+import logging
 import os
+import tempfile
+from datetime import timedelta
 
 from aiogram import F, Router, Bot
 from aiogram.enums import ChatType
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import ReplyKeyboardRemove, Message, CallbackQuery, InlineKeyboardButton
+from aiogram.types import ReplyKeyboardRemove, Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, \
+    BufferedInputFile, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from bot.admins.exporter import export_orders, fit_for_telegram, parse_period
+from bot.admins.importer import CatalogImporter, detect_encoding, open_document, read_rows, IMPORT_EXTENSIONS, \
+    IMPORT_COLUMNS
 from bot.filters.is_admin import ChatTypeFilter, IsAdmin
+from bot.inlinemode import search_index
 from bot.keyboards import show_category, admin_buttons
-from db.models import Category, Product
+from bot.utils.broadcast import broadcasts
+from bot.utils.callbacks import callbacks, AdminList, AdminPage, PickCategory, DeleteCategory, DeleteProduct, \
+    BroadcastConfirm, BroadcastStop
+from bot.utils.catalog import catalog, page_rows
+from bot.utils.media import media_store
+from db.analytics import sales_summary, rebuild_sales
+from db.models import Category, Product, Broadcast, User
 
 admin_router = Router()
 admin_router.message.filter(ChatTypeFilter([ChatType.PRIVATE]), IsAdmin())
 
-MEDIA_DIRECTORY = './media'
-os.makedirs(MEDIA_DIRECTORY, exist_ok=True)
-
 
 class FormAdministrator(StatesGroup):
     product_title = State()
@@ -32,6 +44,9 @@ class FormAdministrator(StatesGroup):
     product_delete = State()
     category_delete = State()
     social_link = State()
+    broadcast_message = State()
+    broadcast_confirm = State()
+    import_file = State()
 
 
 @admin_router.message(CommandStart())
@@ -63,7 +78,8 @@ async def add_category(message: Message, state: FSMContext) -> None:
         )
         await state.set_state(FormAdministrator.category_name)
         return
-    await Category.create(name=category_name)
+    category = await Category.create(name=category_name)
+    await catalog.invalidate(categories=[category.id])
     await state.clear()
     await message.answer("Category Bazaga Saqlandi ✅", reply_markup=admin_buttons())
 
@@ -84,11 +100,9 @@ async def add_product_title(message: Message, state: FSMContext):
 @admin_router.message(FormAdministrator.product_image)
 async def add_product_image(message: Message, state: FSMContext, bot: Bot):
     try:
-        file = await bot.get_file(message.photo[-1].file_id)
-        file_name = f"{file.file_unique_id}.jpg"
-        file_path = os.path.join(MEDIA_DIRECTORY, file_name)
-        await bot.download_file(file.file_path, file_path)
-        await state.update_data(product_image=file_path)
+        image = await bot.download(message.photo[-1].file_id)
+        file_path = await media_store.save(image.getvalue())
+        await state.update_data(product_image=file_path, product_image_file_id=message.photo[-1].file_id)
         await state.set_state(FormAdministrator.product_description)
         await message.answer("Product 📝 description kiriting 👇🏻")
     except Exception as e:
@@ -120,38 +134,52 @@ async def add_product_discount_price(message: Message, state: FSMContext):
 async def add_product_quantity(message: Message, state: FSMContext):
     await state.update_data(product_quantity=int(message.text))
     await state.set_state(FormAdministrator.product_category)
-    categories = await Category.get_all()
-    ikb = InlineKeyboardBuilder()
-    for category in categories:
-        ikb.add(
-            InlineKeyboardButton(
-                text=category.name,
-                callback_data=str(category.id)
-            )
-        )
-    ikb.adjust(2, repeat=True)
-    await message.answer('Categoryni tanlang 👇🏻', reply_markup=ikb.as_markup())
+    await message.answer('Categoryni tanlang 👇🏻', reply_markup=await choice_keyboard(AdminList.PICK_CATEGORY))
+
+
+ADMIN_LIST_ITEMS = {
+    AdminList.PICK_CATEGORY: PickCategory,
+    AdminList.DELETE_CATEGORY: DeleteCategory,
+    AdminList.DELETE_PRODUCT: DeleteProduct,
+}
+
+
+async def choice_keyboard(kind: AdminList, cursor=0, back=False) -> InlineKeyboardMarkup:
+    if kind == AdminList.DELETE_PRODUCT:
+        page = await catalog.product_page(None, cursor, back)
+    else:
+        page = await catalog.category_page(cursor, back)
+    item = ADMIN_LIST_ITEMS[kind]
+    return InlineKeyboardMarkup(inline_keyboard=page_rows(
+        page, lambda row: item(id=row.id).pack(),
+        lambda cursor_, back_: AdminPage(kind=kind, cursor=cursor_, back=back_).pack()))
+
 
+@callbacks.handler(AdminPage, IsAdmin())
+async def choice_page(callback: CallbackQuery, callback_data: AdminPage) -> None:
+    await callback.message.edit_reply_markup(reply_markup=await choice_keyboard(
+        callback_data.kind, callback_data.cursor, callback_data.back))
 
-@admin_router.callback_query(FormAdministrator.product_category)
-async def add_product_category(callback: CallbackQuery, state: FSMContext):
-    categories = await Category.get_all()
-    category_ids = [category.id for category in categories]
 
-    if int(callback.data) not in category_ids:
+@callbacks.handler(PickCategory, FormAdministrator.product_category)
+async def add_product_category(callback: CallbackQuery, callback_data: PickCategory, state: FSMContext):
+    if await catalog.category(callback_data.id) is None:
         await callback.answer('Category tanlashda xatolik Mavjud ‼️')
         return
 
     data = await state.get_data()
-    await Product.create(
+    product = await Product.create(
         title=data['product_title'],
         image=data['product_image'],
+        image_file_id=data.get('product_image_file_id'),
         description=data['product_description'],
         price=float(data['product_price']),
         discount_price=float(data['product_discount_price']),
         quantity=int(data['product_quantity']),
-        category_id=int(callback.data),
+        category_id=callback_data.id,
     )
+    search_index.add(product)
+    await catalog.invalidate(products=[product.id])
 
     await state.clear()
     await callback.message.delete()
@@ -160,27 +188,24 @@ async def add_product_category(callback: CallbackQuery, state: FSMContext):
 
 @admin_router.message(F.text == "Product ➖ (🗑 o'chirish)")
 async def show_products_for_deletion(message: Message, state: FSMContext) -> None:
-    products = await Product.get_all()
-
-    if not products:
+    markup = await choice_keyboard(AdminList.DELETE_PRODUCT)
+    if not markup.inline_keyboard:
         await message.answer("Hozirda hech qanday product mavjud emas.")
         return
 
-    ikb = InlineKeyboardBuilder()
-    ikb.row(*[InlineKeyboardButton(text=product.title, callback_data=str(product.id)) for product in products])
-    ikb.adjust(2, 2)
-
-    await message.answer("O'chirilishi kerak bo'lgan productni tanlang 👇🏻", reply_markup=ikb.as_markup())
+    await message.answer("O'chirilishi kerak bo'lgan productni tanlang 👇🏻", reply_markup=markup)
     await state.set_state(FormAdministrator.product_delete)
 
 
-@admin_router.callback_query(FormAdministrator.product_delete)
-async def delete_product(callback: CallbackQuery, state: FSMContext) -> None:
-    product_id = int(callback.data)
+@callbacks.handler(DeleteProduct, FormAdministrator.product_delete)
+async def delete_product(callback: CallbackQuery, callback_data: DeleteProduct, state: FSMContext) -> None:
+    product_id = callback_data.id
 
     product = await Product.get(id_=product_id)
     if product:
         await Product.delete(id_=product_id)
+        search_index.remove(product_id)
+        await catalog.invalidate(products=[product_id])
         await callback.message.delete()
         await callback.message.answer(
             f"Product '{product.title}' muvaffaqiyatli o'chirildi ✅",
@@ -194,28 +219,22 @@ async def delete_product(callback: CallbackQuery, state: FSMContext) -> None:
 
 @admin_router.message(F.text == "Category ➖ (🗑 o'chirish)")
 async def category_delete(message: Message, state: FSMContext) -> None:
-    categories = await Category.get_all()
-    if not categories:
+    markup = await choice_keyboard(AdminList.DELETE_CATEGORY)
+    if not markup.inline_keyboard:
         await message.answer("Categorylar mavjud emas !!!")
         return
 
-    ikb = InlineKeyboardBuilder()
-    for category in categories:
-        ikb.add(
-            InlineKeyboardButton(
-                text=category.name,
-                callback_data=str(category.id)
-            )
-        )
-    await message.answer("Category tanlang 👇🏻", reply_markup=ikb.as_markup())
+    await message.answer("Category tanlang 👇🏻", reply_markup=markup)
     await state.set_state(FormAdministrator.category_delete)
 
 
-@admin_router.callback_query(FormAdministrator.category_delete)
-async def category_delete(callback: CallbackQuery, state: FSMContext) -> None:
+@callbacks.handler(DeleteCategory, FormAdministrator.category_delete)
+async def category_delete(callback: CallbackQuery, callback_data: DeleteCategory, state: FSMContext) -> None:
     try:
-        category_id = int(callback.data)
+        category_id = callback_data.id
         await Category.delete(id_=category_id)
+        search_index.remove_category(category_id)
+        await catalog.invalidate(categories=[category_id])
         await callback.message.delete()
         await callback.message.answer(
             text="Category va unga tegishli productlar o'chirildi ✅",
@@ -227,3 +246,160 @@ async def category_delete(callback: CallbackQuery, state: FSMContext) -> None:
         await callback.answer(f"Xatolik yuz berdi: {e}")
     finally:
         await state.clear()
+
+
+@admin_router.message(F.text == '📣 Xabar yuborish')
+async def broadcast_start(message: Message, state: FSMContext) -> None:
+    if await Broadcast.get_running():
+        await message.answer("Hozir boshqa xabar yuborilmoqda, u tugashini kuting ⏳")
+        return
+    await state.set_state(FormAdministrator.broadcast_message)
+    await message.answer("Barcha foydalanuvchilarga yuboriladigan xabarni jo'nating 👇🏻",
+                         reply_markup=ReplyKeyboardRemove())
+
+
+@admin_router.message(FormAdministrator.broadcast_message)
+async def broadcast_message(message: Message, state: FSMContext) -> None:
+    await state.update_data(broadcast_chat_id=message.chat.id, broadcast_message_id=message.message_id)
+    await state.set_state(FormAdministrator.broadcast_confirm)
+    ikb = InlineKeyboardBuilder()
+    ikb.row(InlineKeyboardButton(text='✅ Yuborish', callback_data=BroadcastConfirm(send=True).pack()),
+            InlineKeyboardButton(text='❌ Bekor qilish', callback_data=BroadcastConfirm(send=False).pack()))
+    await message.answer(f"Xabar {await User.count()} ta foydalanuvchiga yuborilsinmi?", reply_markup=ikb.as_markup())
+
+
+@callbacks.handler(BroadcastConfirm, FormAdministrator.broadcast_confirm)
+async def broadcast_confirm(callback: CallbackQuery, callback_data: BroadcastConfirm, state: FSMContext,
+                            bot: Bot) -> None:
+    data = await state.get_data()
+    await state.clear()
+    await callback.message.delete()
+    if not callback_data.send:
+        await callback.message.answer("Bekor qilindi ❌", reply_markup=admin_buttons())
+        return
+    broadcast = await broadcasts.start(bot, callback.from_user.id, data['broadcast_chat_id'],
+                                       data['broadcast_message_id'])
+    if broadcast is None:
+        await callback.message.answer("Hozir boshqa xabar yuborilmoqda, u tugashini kuting ⏳",
+                                      reply_markup=admin_buttons())
+        return
+    await callback.message.answer("Xabar yuborish boshlandi 📣", reply_markup=admin_buttons())
+
+
+@callbacks.handler(BroadcastStop, IsAdmin())
+async def broadcast_stop(callback: CallbackQuery, callback_data: BroadcastStop) -> None:
+    if await Broadcast.cancel(callback_data.id):
+        await callback.answer("Xabar yuborish to'xtatilmoqda ⏹")
+    else:
+        await callback.answer("Xabar yuborish allaqachon tugagan")
+
+
+def import_summary(importer: CatalogImporter, done=False, failed=False) -> str:
+    if failed:
+        title = "⚠️ Import xatolik bilan to'xtadi"
+    else:
+        title = "✅ Import yakunlandi" if done else "⏳ Import davom etmoqda..."
+    return (f"{title}\n\n"
+            f"📄 Qatorlar: {importer.total}\n"
+            f"➕ Yangi: {importer.inserted}\n"
+            f"🔄 Yangilangan: {importer.updated}\n"
+            f"❌ Xatolar: {len(importer.errors)}")
+
+
+@admin_router.message(Command('import'))
+async def import_start(message: Message, state: FSMContext) -> None:
+    await state.set_state(FormAdministrator.import_file)
+    await message.answer("CSV yoki JSONL faylni yuboring 👇🏻\n\n"
+                         f"Ustunlar: <code>{', '.join(IMPORT_COLUMNS)}</code>\n"
+                         "Productlar isbn bo'yicha yangilanadi, yangi categorylar avtomatik yaratiladi.")
+
+
+@admin_router.message(FormAdministrator.import_file, F.document)
+async def import_file(message: Message, state: FSMContext, bot: Bot) -> None:
+    await state.clear()
+    file_name = message.document.file_name or ''
+    if not file_name.lower().endswith(IMPORT_EXTENSIONS):
+        await message.answer("Faqat .csv yoki .jsonl fayl qabul qilinadi ‼️", reply_markup=admin_buttons())
+        return
+
+    progress = await message.answer("⏳ Import boshlandi...")
+    fd, path = tempfile.mkstemp(prefix='import_', suffix=os.path.splitext(file_name)[1])
+    os.close(fd)
+    importer = CatalogImporter(await catalog.categories())
+
+    async def report(importer):
+        await progress.edit_text(import_summary(importer))
+
+    failed = False
+    try:
+        # Downloaded to disk and read back a row at a time, so big catalogs are never held in memory.
+        await bot.download(message.document, destination=path)
+        encoding = await asyncio.to_thread(detect_encoding, path)
+        if encoding != 'utf-8-sig':
+            await message.answer(f"Fayl UTF-8 emas, {encoding} deb o'qildi ⚠️")
+        with open_document(path, encoding) as file:
+            await importer.run(read_rows(file, file_name), progress=report)
+    except Exception as e:
+        logging.exception(f"Import of {file_name} failed: {e}")
+        failed = True
+    finally:
+        os.remove(path)
+    # Whatever got written is live: refresh the caches and tell the admin what happened.
+    await catalog.invalidate_all()
+    await search_index.load()
+    await progress.edit_text(import_summary(importer, done=True, failed=failed))
+    if importer.errors:
+        await message.answer_document(BufferedInputFile(importer.error_report(), filename='import_errors.csv'),
+                                      caption="Xato qatorlar ro'yxati")
+    await message.answer("Tanlovingiz 👇🏻", reply_markup=admin_buttons())
+
+
+@admin_router.message(Command('export'))
+async def export_handler(message: Message, command: CommandObject) -> None:
+    try:
+        start, end = parse_period(command.args)
+    except ValueError:
+        await message.answer("Format: <code>/export 2024-01-01 2024-01-31</code> (sanalarsiz — oxirgi 30 kun)")
+        return
+
+    last_day = (end - timedelta(days=1)).strftime('%Y-%m-%d')
+    progress = await message.answer("⏳ Eksport tayyorlanmoqda...")
+    fd, path = tempfile.mkstemp(prefix=f"orders_{start:%Y-%m-%d}_{last_day}_", suffix='.csv')
+    os.close(fd)
+    paths = {path}
+    try:
+        count = await export_orders(start, end, path)
+        document = await asyncio.to_thread(fit_for_telegram, path)
+        paths.add(document)
+        suffix = '.csv' if document == path else '.csv.zip'
+        await message.answer_document(
+            FSInputFile(document, filename=f"orders_{start:%Y-%m-%d}_{last_day}{suffix}"),
+            caption=f"📦 {start:%Y-%m-%d} — {last_day}: {count} ta qator"
+        )
+        await progress.delete()
+    except Exception as e:
+        await progress.edit_text(f"Xatolik yuz berdi: {e}")
+    finally:
+        for file_path in paths:
+            os.remove(file_path)
+
+
+@admin_router.message(Command('stats'))
+async def stats_handler(message: Message, command: CommandObject) -> None:
+    if command.args == 'rebuild':
+        await rebuild_sales()
+    stats = await sales_summary()
+    periods = (('Bugun', 'today'), ('7 kun', 'week'), ('30 kun', 'month'), ('Jami', 'total'))
+    msg = '📊 <b>Statistika</b>\n\n'
+    for title, key in periods:
+        orders, items, revenue = stats[key]
+        msg += f"<b>{title}:</b> {orders} buyurtma, {items} ta kitob, {revenue:,.0f} sum\n"
+    if stats['products']:
+        msg += '\n🏆 <b>Top kitoblar</b>\n'
+        for i, (title, items, revenue) in enumerate(stats['products'], 1):
+            msg += f"{i}. {title} — {items} ta, {revenue:,.0f} sum\n"
+    if stats['categories']:
+        msg += '\n📚 <b>Categoriyalar</b>\n'
+        for name, items, revenue in stats['categories']:
+            msg += f"• {name} — {items} ta, {revenue:,.0f} sum\n"
+    await message.answer(msg)
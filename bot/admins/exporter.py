@@ -0,0 +1,78 @@
+import csv
+import os
+import zipfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from db import Order, Product, database
+from db.base import TimeStamp
+from db.models import OrderItem
+
+EXPORT_CHUNK = 5000
+EXPORT_COLUMNS = ('order_id', 'created_at', 'status', 'user_telegram_id', 'phone_number', 'product_id', 'isbn',
+                  'title', 'quantity', 'price', 'line_total', 'order_total')
+# Telegram accepts documents up to 50 MB from bots; bigger exports are zipped.
+DOCUMENT_LIMIT = 49 * 1024 * 1024
+
+
+def parse_period(args: str | None) -> tuple[datetime, datetime]:
+    """``'2024-01-01 2024-01-31'`` (both days included), one day, or nothing for the last 30 days."""
+    days = (args or '').split()
+    if len(days) > 2:
+        raise ValueError
+    if not days:
+        end = datetime.now(TimeStamp.TASHKENT_TIMEZONE).date()
+        start = end - timedelta(days=29)
+    else:
+        start = datetime.strptime(days[0], '%Y-%m-%d').date()
+        end = datetime.strptime(days[-1], '%Y-%m-%d').date()
+    if end < start:
+        raise ValueError
+    localize = TimeStamp.TASHKENT_TIMEZONE.localize
+    return (localize(datetime.combine(start, datetime.min.time())),
+            localize(datetime.combine(end + timedelta(days=1), datetime.min.time())))
+
+
+async def export_orders(start: datetime, end: datetime, path: str) -> int:
+    """Write every order line created in ``[start, end)`` to a CSV file at ``path``; returns the row count.
+
+    Rows come from a server-side cursor in chunks of ``EXPORT_CHUNK`` and are written
+    as they arrive, so memory use does not depend on the size of the export.
+    """
+    query = (
+        select(Order.id, Order.created_at, Order.order_status, Order.user_telegram_id, Order.phone_number,
+               Product.id, Product.isbn, Product.title, OrderItem.quantity,
+               func.coalesce(OrderItem.price, Product.price), Order.total_amount)
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(Order.created_at >= start, Order.created_at < end)
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=EXPORT_CHUNK)
+    )
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        async with database.session() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                writer.writerows(
+                    (order_id, created_at.strftime('%Y-%m-%d %H:%M:%S'), status.name, user_telegram_id, phone,
+                     product_id, isbn or '', title, quantity, price, quantity * price, total)
+                    for order_id, created_at, status, user_telegram_id, phone, product_id, isbn, title, quantity,
+                    price, total in rows
+                )
+                count += len(rows)
+    return count
+
+
+def fit_for_telegram(path: str) -> str:
+    """Zip the export next to itself when it is too big to send as is; returns the path to send."""
+    if os.path.getsize(path) <= DOCUMENT_LIMIT:
+        return path
+    zip_path = f'{path}.zip'
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.write(path, arcname=os.path.basename(path))
+    return zip_path
@@ -0,0 +1,234 @@
+import codecs
+import csv
+import io
+import json
+import time
+
+from sqlalchemy import literal_column, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from db import Category, Product, database
+
+IMPORT_BATCH = 1000
+READ_CHUNK = 64 * 1024
+IMPORT_EXTENSIONS = ('.csv', '.jsonl', '.ndjson')
+IMPORT_COLUMNS = ('isbn', 'title', 'description', 'price', 'discount_price', 'quantity', 'category', 'image')
+
+
+# Tried in order; cp1251 maps every byte, so a document always decodes.
+ENCODINGS = ('utf-8-sig', 'cp1251')
+CATEGORY_LOCK_ID = 7_120_240_017
+
+
+def detect_encoding(path: str) -> str:
+    """The encoding to read the file at ``path`` with: UTF-8, else cp1251 as Excel on Windows saves it.
+
+    The file is decoded chunk by chunk and nothing is kept, so this is one pass
+    over the disk whatever the size of the document.
+    """
+    for encoding in ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as file:
+                while chunk := file.read(READ_CHUNK):
+                    decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def open_document(path: str, encoding: str):
+    return io.TextIOWrapper(open(path, 'rb'), encoding=encoding, errors='replace', newline='')
+
+
+def read_rows(file, file_name: str):
+    """Yield ``(line_no, row)`` from a CSV or JSON-lines text ``file``, reading one row at a time.
+
+    A line that cannot be parsed is yielded with the ``ValueError`` instead of a row.
+    """
+    if not file_name.lower().endswith('.csv'):
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("JSON obyekt emas")
+                yield line_no, row
+            except ValueError as e:
+                yield line_no, ValueError(f"JSON xato: {e}")
+        return
+
+    sample = file.read(4096)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(file, dialect=dialect)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, ValueError(f"CSV xato: {e}")
+            continue
+        yield reader.line_num, row
+
+
+def _number(row, key, type_, default=None):
+    value = row.get(key, '')
+    if value == '':
+        if default is None:
+            raise ValueError(f"{key} bo'sh")
+        return default
+    try:
+        number = type_(value.replace(' ', '').replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"{key} noto'g'ri: {value}")
+    if number < 0:
+        raise ValueError(f"{key} manfiy bo'lishi mumkin emas")
+    return number
+
+
+def clean_row(raw: dict) -> dict:
+    row = {str(key).strip().lower(): '' if value is None else str(value).strip()
+           for key, value in raw.items() if key is not None}
+    isbn = row.get('isbn', '').replace('-', '')
+    if not isbn:
+        raise ValueError("isbn bo'sh")
+    if len(isbn) > 32:
+        raise ValueError("isbn juda uzun")
+    if not row.get('title'):
+        raise ValueError("title bo'sh")
+    if not row.get('category'):
+        raise ValueError("category bo'sh")
+    return {
+        'isbn': isbn,
+        'title': row['title'][:255],
+        'description': row.get('description', ''),
+        'price': _number(row, 'price', float),
+        'discount_price': _number(row, 'discount_price', float, 0.0),
+        'quantity': _number(row, 'quantity', int, 0),
+        'category': row['category'][:255],
+        'image': row.get('image') or None,
+    }
+
+
+class CatalogImporter:
+    """Upserts products keyed by ``isbn`` in batches of multi-row ``INSERT ... ON CONFLICT DO UPDATE``.
+
+    Categories are matched by name (case-insensitively) and created when missing.
+    Each batch is its own transaction; rows that fail validation, or belong to a
+    batch the database rejected, end up in ``errors`` with their line number.
+    ``image`` may be an image URL or a Telegram file_id; Telegram fetches it on
+    the first send.
+    """
+
+    def __init__(self, categories):
+        self.categories = {category.name.casefold(): category.id for category in categories}
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors: list[tuple[int, str, str]] = []
+        self._reported_at = 0.0
+
+    async def run(self, rows, progress=None, interval: float = 2):
+        batch = {}
+        for line_no, raw in rows:
+            self.total += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                row = clean_row(raw)
+            except ValueError as e:
+                isbn = '' if isinstance(raw, Exception) else next(
+                    (str(value) for key, value in raw.items() if str(key).strip().lower() == 'isbn'), '')
+                self.errors.append((line_no, isbn, str(e)))
+                continue
+            # The same isbn twice in one statement is an error for ON CONFLICT; the last row wins.
+            batch[row['isbn']] = (line_no, row)
+            if len(batch) >= IMPORT_BATCH:
+                await self._write(batch)
+                batch = {}
+                if progress is not None and time.monotonic() - self._reported_at >= interval:
+                    self._reported_at = time.monotonic()
+                    await progress(self)
+        if batch:
+            await self._write(batch)
+
+    def error_report(self) -> bytes:
+        report = io.StringIO()
+        writer = csv.writer(report)
+        writer.writerow(('line', 'isbn', 'error'))
+        writer.writerows(self.errors)
+        return report.getvalue().encode('utf-8-sig')
+
+    @staticmethod
+    async def _create_categories(session, missing: dict[str, str]) -> dict[str, int]:
+        """Ids of the ``missing`` categories (casefolded name -> name), creating the ones really absent.
+
+        Category names are not unique in the schema, so there is nothing for
+        ON CONFLICT to use; a transaction-level advisory lock makes concurrent
+        imports look up and create categories one at a time instead.
+        """
+        await session.execute(select(func.pg_advisory_xact_lock(CATEGORY_LOCK_ID)))
+        lowered = func.lower(Category.name)
+        query = select(lowered, func.min(Category.id)) \
+            .where(lowered.in_([name.lower() for name in missing.values()])).group_by(lowered)
+        found = dict((await session.execute(query)).all())
+        ids = {key: found[name.lower()] for key, name in missing.items() if name.lower() in found}
+        absent = {key: name for key, name in missing.items() if key not in ids}
+        if absent:
+            query = insert(Category).values([{'name': name} for name in absent.values()]) \
+                .returning(Category.id, Category.name)
+            ids.update((name.casefold(), id_) for id_, name in (await session.execute(query)).all())
+        return ids
+
+    async def _write(self, batch):
+        created = {}
+        try:
+            async with database.session() as session:
+                missing = {row['category'].casefold(): row['category'] for _, row in batch.values()
+                           if row['category'].casefold() not in self.categories}
+                if missing:
+                    created = await self._create_categories(session, missing)
+                category_ids = {**self.categories, **created}
+
+                values = [{
+                    'isbn': row['isbn'],
+                    'title': row['title'],
+                    'description': row['description'],
+                    'price': row['price'],
+                    'discount_price': row['discount_price'],
+                    'quantity': row['quantity'],
+                    'category_id': category_ids[row['category'].casefold()],
+                    'image': '',
+                    'image_file_id': row['image'],
+                } for _, row in batch.values()]
+                query = insert(Product).values(values)
+                query = query.on_conflict_do_update(
+                    index_elements=['isbn'],
+                    set_={
+                        'title': query.excluded.title,
+                        'description': query.excluded.description,
+                        'price': query.excluded.price,
+                        'discount_price': query.excluded.discount_price,
+                        'quantity': query.excluded.quantity,
+                        'category_id': query.excluded.category_id,
+                        'image_file_id': func.coalesce(query.excluded.image_file_id, Product.image_file_id),
+                        'updated_at': func.now(),
+                    },
+                ).returning(literal_column('xmax = 0').label('inserted'))
+                inserted = sum(1 for row in (await session.execute(query)).all() if row.inserted)
+                await session.commit()
+        except Exception as e:
+            for line_no, row in batch.values():
+                self.errors.append((line_no, row['isbn'], f"DB: {e}"))
+            return
+        self.categories.update(created)
+        self.inserted += inserted
+        self.updated += len(batch) - inserted
@@ -1,3 +1,2 @@
 from bot.baskets.basket import basket_msg, to_basket, to_category
 from bot.baskets.orders import order_router
-from bot.baskets.basket import basket_router
@@ -1,30 +1,49 @@
+import logging
+from datetime import datetime, timezone
+
 from aiogram import F, Router, Bot
 from aiogram.enums import ContentType, ParseMode
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramAPIError
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import CallbackQuery, InlineKeyboardButton, ReplyKeyboardMarkup, \
     KeyboardButton, Message, InlineKeyboardMarkup
-from aiogram.utils.i18n import gettext as _, lazy_gettext as __
+from aiogram.utils.i18n import gettext as _
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot.baskets import to_category, basket_msg
-from bot.config import ADMIN_LIST
+from bot.filters.is_admin import IsAdmin
 from bot.keyboards import main_buttons
-from db import Basket, User, Order, Product
-from db.models import OrderItem
+from bot.utils.admins import admin_registry
+from bot.utils.callbacks import callbacks, ClearBasket, Checkout, CancelCheckout, PlaceOrder, AdminOrder, OrdersPage
+from bot.utils.intents import intents
+from config import conf
+from db import Basket, User, Order
+from db.inventory import OutOfStockError, accept_order, cancel_order
 
 order_router = Router()
 
+ORDERS_PAGE_SIZE = 5
+
 
 class BasketState(StatesGroup):
     phone_number = State()
 
 
-async def order_message(user_id):
-    all_sum = 0
+def orders_page(order: Order, newer: bool) -> str:
+    created_at = order.created_at
+    micros = int(created_at.timestamp()) * 10 ** 6 + created_at.microsecond
+    return OrdersPage(newer=newer, micros=micros, order_id=order.id).pack()
+
+
+def parse_order_cursor(callback_data: OrdersPage):
+    micros = callback_data.micros
+    created_at = datetime.fromtimestamp(micros // 10 ** 6, tz=timezone.utc).replace(microsecond=micros % 10 ** 6)
+    return created_at, callback_data.order_id
+
+
+def order_message(orders):
     msg = ''
-    orders = await Order.get(user_telegram_id=user_id)
     for order in orders:
         msg += _(
             '🔢 Buyurtma raqami: <b>{order_id}</b>\n'
@@ -34,30 +53,35 @@ async def order_message(user_id):
             date_time=str(order.created_at.strftime('%Y-%m-%d %H:%M:%S')),
             order_status=order.order_status.value
         )
-        order_items = await OrderItem.get_products_by_user(user_id=order.user_telegram_id, order_id=order.id)
-        i = 1
-        summa = 0
-        for item in order_items:
-            summa += int(item.quantity) * int(item.product.price)
-            msg += f'\n{i}. 📕 Kitob nomi: {item.product.title} \n{item.quantity} x {item.product.price} = {str(int(item.quantity) * int(item.product.price))} sum\n\n'
-            i += 1
-        all_sum += summa
+        for i, item in enumerate(order.order_items, start=1):
+            # The price the order was placed at; a line written by a worker still on the old code has none.
+            price = item.product.price if item.price is None else item.price
+            msg += f'\n{i}. 📕 Kitob nomi: {item.product.title} \n{item.quantity} x {price} = {item.quantity * price} sum\n\n'
+        msg += f'\n💸 Umumiy narxi: {order.total_amount} sum\n'
         msg += '~~~~~~~~~~~~~~~~~~~~~~~~~\n'
-    msg += f'\n💸 Umumiy narxi: {all_sum} sum'
     return msg
 
 
+def orders_keyboard(orders, has_older, has_newer):
+    ikb = InlineKeyboardBuilder()
+    if has_newer:
+        ikb.add(InlineKeyboardButton(text=_('⬅️ Yangiroq'), callback_data=orders_page(orders[0], newer=True)))
+    if has_older:
+        ikb.add(InlineKeyboardButton(text=_('Eskiroq ➡️'), callback_data=orders_page(orders[-1], newer=False)))
+    return ikb.as_markup()
+
+
 async def clear_users_basket(user_telegram_id):
     await Basket.delete(user_telegram_id=user_telegram_id)
 
 
-@order_router.callback_query(F.data.startswith('clear'))
+@callbacks.handler(ClearBasket)
 async def clear(callback: CallbackQuery):
     await clear_users_basket(callback.from_user.id)
     await to_category(callback)
 
 
-@order_router.callback_query(F.data.endswith('confirm'))
+@callbacks.handler(Checkout)
 async def confirm(callback: CallbackQuery, state: FSMContext):
     rkb = ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=_('📞 Telefon raqam'), request_contact=True)]], resize_keyboard=True)
@@ -92,42 +116,40 @@ async def phone_number(message: Message, state: FSMContext):
     msg = f"{await basket_msg(message.from_user.id)}\nTelefon raqamingiz: {message.contact.phone_number}\n\n<i>Buyurtma berasizmi?</i>"
     ikb = InlineKeyboardBuilder()
     ikb.row(
-        InlineKeyboardButton(text=_("❌ Yo'q"), callback_data='canceled_order'),
-        InlineKeyboardButton(text=_('✅ Ha'),
-                             callback_data=f'confirm_order_{int(message.from_user.id)}_{message.contact.phone_number}')
+        InlineKeyboardButton(text=_("❌ Yo'q"), callback_data=CancelCheckout().pack()),
+        InlineKeyboardButton(text=_('✅ Ha'), callback_data=PlaceOrder(phone=message.contact.phone_number).pack())
     )
 
     await message.answer(msg, reply_markup=ikb.as_markup())
     await state.clear()
 
 
-@order_router.callback_query(F.data.endswith('canceled_order'))
+@callbacks.handler(CancelCheckout)
 async def canceled_order(callback: CallbackQuery):
     await callback.message.delete()
     await callback.message.answer(_('❌ Bekor qilindi'), reply_markup=main_buttons())
 
 
-@order_router.callback_query(F.data.startswith('confirm_order'))
-async def confirm_order(callback: CallbackQuery, bot: Bot):
-    summa = 0
+@callbacks.handler(PlaceOrder)
+async def confirm_order(callback: CallbackQuery, callback_data: PlaceOrder, bot: Bot):
     msg = ''
-    total_amount = float(callback.message.text.split("Jami: ")[-1].split()[0])
-    phone_number = callback.data.split("_")[-1]
-    user_id = callback.data.split("_")[-2]
-    order = await Order.create(
-        user_telegram_id=callback.from_user.id,
-        phone_number=phone_number,
-        total_amount=total_amount
-    )
-    baskets = await Basket.get(user_telegram_id=callback.from_user.id)
-    for orderitem in baskets:
-        await OrderItem.create(
-            quantity=orderitem.quantity,
-            order_id=order.id,
-            user_telegram_id=orderitem.user_telegram_id,
-            product_id=orderitem.product_id,
-
+    phone_number = callback_data.phone
+    try:
+        order, lines, created = await Order.checkout(
+            user_telegram_id=callback.from_user.id,
+            phone_number=phone_number,
+            checkout_key=f'{callback.message.chat.id}:{callback.message.message_id}',
+            reservation_ttl=conf.bot.STOCK_RESERVATION_TTL
         )
+    except OutOfStockError:
+        await callback.answer(_("Ayni vaqtda omborda buncha kitob mavjud emas! 😊"), show_alert=True)
+        return
+    if order is None:
+        await callback.answer(_("🛒 Savatingiz bo'sh"), show_alert=True)
+        return
+    if not created:
+        await callback.answer()
+        return
     msg += _(
         '🔢 Buyurtma raqami: <b>{order_id}</b>\n'
         '📆 Buyurtma qilingan sana: <b>{date_time}</b>\n'
@@ -136,44 +158,36 @@ async def confirm_order(callback: CallbackQuery, bot: Bot):
         date_time=str(order.created_at.strftime('%Y-%m-%d %H:%M:%S')),
         order_status=order.order_status.value
     )
-    order_items = await OrderItem.get_products_by_user(user_id=order.user_telegram_id, order_id=order.id)
-    i = 1
-    for item in order_items:
-        summa += int(item.quantity) * int(item.product.price)
-        msg += f'\n{i}. 📕 Kitob nomi: {item.product.title} \n{item.quantity} x {item.product.price} = {str(int(item.quantity) * int(item.product.price))} sum\n\n'
-        i += 1
+    for i, (title, quantity, price, line_total) in enumerate(lines, 1):
+        msg += f'\n{i}. 📕 Kitob nomi: {title} \n{quantity} x {price} = {line_total} sum\n\n'
     msg += '~~~~~~~~~~~~~~~~~~~~~~~~~\n'
-    msg += f'\n💸 Umumiy narxi: {summa} sum'
+    msg += f'\n💸 Umumiy narxi: {order.total_amount} sum'
     user_telegram_id = callback.from_user.id
     ikb = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
                 text=_("❌ Yo'q"),
-                callback_data=f'from_admin_canceled_order-{user_telegram_id}-{user_id}-{order.id}'
+                callback_data=AdminOrder(accept=False, user_id=user_telegram_id, order_id=order.id).pack()
             ),
             InlineKeyboardButton(
                 text=_('✅ Ha'),
-                callback_data=f'from_admin_order_accept-{user_telegram_id}-{user_id}-{order.id}'
+                callback_data=AdminOrder(accept=True, user_id=user_telegram_id, order_id=order.id).pack()
             )
         ]
     ])
 
     user_full_name = callback.from_user.full_name or _("Foydalanuvchi")
 
-    if not ADMIN_LIST:
+    if not admin_registry:
         await callback.message.answer(_("Admin list is empty; unable to notify admin."))
         return
 
-    try:
-        await bot.send_message(
-            ADMIN_LIST[0],
-            msg +
-            f"\n\nKlient: {callback.data[12:].replace('r_', '')} <a href='tg://user?id={callback.from_user.id}'>{user_full_name}</a>\nBuyurtmani qabul qilasizmi?",
-            parse_mode=ParseMode.HTML,
-            reply_markup=ikb
-        )
-    except TelegramBadRequest as e:
-        print(f"Error sending message: {e}")
+    admin_msg = msg + f"\n\nKlient: {user_telegram_id}_{phone_number} <a href='tg://user?id={callback.from_user.id}'>{user_full_name}</a>\nBuyurtmani qabul qilasizmi?"
+    for admin_id in admin_registry:
+        try:
+            await bot.send_message(admin_id, admin_msg, parse_mode=ParseMode.HTML, reply_markup=ikb)
+        except TelegramAPIError as e:
+            logging.warning(f"Order {order.id} not sent to admin {admin_id}: {e}")
 
     await callback.message.answer(
         _('✅ Hurmatli mijoz! Buyurtmangiz uchun tashakkur.\nBuyurtma raqami: {orders_num}').format(
@@ -182,41 +196,57 @@ async def confirm_order(callback: CallbackQuery, bot: Bot):
         reply_markup=main_buttons()
     )
 
-    await clear_users_basket(callback.from_user.id)
-
 
-@order_router.callback_query(F.data.startswith('from_admin'))
-async def order_accept_canceled(callback: CallbackQuery, bot: Bot):
-    order_id = int(callback.data.split('-')[-1])
-    user_telegram_id = int(callback.data.split('-')[-2])
-    order = (await Order.get(id_=order_id))
-    if callback.data.startswith('from_admin_order_accept'):
-        for item in await OrderItem.get_products_by_user(user_id=order.user_telegram_id, order_id=order_id):
-            product_quantity = (await Product.get(id_=item.product_id)).quantity
-            await Product.update(
-                id_=item.product_id,
-                quantity=(product_quantity - item.quantity)
-            )
+@callbacks.handler(AdminOrder, IsAdmin())
+async def order_accept_canceled(callback: CallbackQuery, callback_data: AdminOrder, bot: Bot):
+    order_id = callback_data.order_id
+    user_telegram_id = callback_data.user_id
+    if callback_data.accept:
+        try:
+            accepted = await accept_order(order_id)
+        except OutOfStockError:
+            await callback.answer("Omborda yetarli kitob mavjud emas ‼️", show_alert=True)
+            return
+        if not accepted:
+            await callback.answer("Bu buyurtma allaqachon ko'rib chiqilgan")
+            await callback.message.edit_reply_markup()
+            return
 
         await bot.send_message(chat_id=user_telegram_id,
                                text=('<i>🎉 Sizning {order_num} raqamli buyurtmangizni admin qabul qildi.</i>').format(
                                    order_num=order_id))
 
         await callback.message.edit_reply_markup()
-    elif callback.data.startswith('from_admin_canceled_order'):
+    else:
+        if not await cancel_order(order_id):
+            await callback.answer("Bu buyurtma allaqachon ko'rib chiqilgan")
+            await callback.message.edit_reply_markup()
+            return
         await bot.send_message(chat_id=callback.message.chat.id,
                                text=(
                                    '<i>❌ Sizning {order_num} raqamli buyurtmangizni admin Tomonidan bekor qilindi !!!.</i>').format(
                                    order_num=order_id))
-    else:
-        await callback.message.delete()
 
 
-@order_router.message(F.text == __('📃 Mening buyurtmalarim'))
+@intents.handler('📃 Mening buyurtmalarim')
 async def my_orders(message: Message):
-    user_telegram_id = message.from_user.id
-    orders = await Order.get(user_telegram_id=user_telegram_id)
+    orders, has_older, has_newer = await Order.get_page(message.from_user.id, limit=ORDERS_PAGE_SIZE)
     if not orders:
         await message.answer(_('🤷‍♂️ Sizda hali buyurtmalar mavjud emas. Yoki bekor qilingan'))
     else:
-        await message.answer(await order_message(user_telegram_id))
+        await message.answer(order_message(orders), reply_markup=orders_keyboard(orders, has_older, has_newer))
+
+
+@callbacks.handler(OrdersPage)
+async def my_orders_page(callback: CallbackQuery, callback_data: OrdersPage):
+    orders, has_older, has_newer = await Order.get_page(
+        callback.from_user.id,
+        cursor=parse_order_cursor(callback_data),
+        newer=callback_data.newer,
+        limit=ORDERS_PAGE_SIZE
+    )
+    if not orders:
+        await callback.answer()
+        return
+    await callback.message.edit_text(order_message(orders),
+                                     reply_markup=orders_keyboard(orders, has_older, has_newer))
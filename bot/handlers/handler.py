@@ -1,17 +1,21 @@
-from aiogram import F, Router
+from aiogram import Router
 from aiogram.enums import ParseMode
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
-from aiogram.types import InlineKeyboardButton, CallbackQuery
-from aiogram.types import Message, FSInputFile
-from aiogram.utils.i18n import gettext as _, lazy_gettext as __
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import CallbackQuery
+from aiogram.types import Message
+from aiogram.utils.i18n import gettext as _
 
 from bot.keyboards import show_category, main_buttons, lang_commands, \
     main_links_buttons, make_plus_minus
 from bot.states.count_state import CountState
-from db import Product, Category
-from db.models import User
+from bot.utils.callbacks import callbacks, Language, BackToCategories, CategoriesPage, CategoryOpen, ProductsPage, \
+    ProductOpen, Noop
+from bot.utils.catalog import catalog
+from bot.utils.intents import intents
+from bot.utils.media import answer_product_photo
+from bot.utils.registrar import registrar
+from db import Product
 
 main_router = Router()
 
@@ -19,14 +23,7 @@ main_router = Router()
 @main_router.message(CommandStart())
 async def command_start_handler(message: Message) -> None:
     msg = _('Assalomu alaykum! Tanlovingiz 👇🏻.')
-    user_data = message.from_user.model_dump(include={'id', 'first_name', 'last_name', 'username'})
-    if not await User.get_with_telegram_id(telegram_id=message.from_user.id):
-        await User.create(
-            first_name=user_data['first_name'],
-            last_name=user_data['last_name'],
-            username=user_data['username'],
-            telegram_id=user_data['id']
-        )
+    if registrar.register(message.from_user):
         msg = _('Assalomu alaykum! \nXush kelibsiz!')
     await message.answer(text=msg, reply_markup=main_buttons())
 
@@ -39,7 +36,7 @@ async def command_help_handler(message: Message) -> None:
 /language - Tilni almashtirish 🔄'''))
 
 
-@main_router.message(F.text == __('🌐 Tilni almshtirish'))
+@intents.handler('🌐 Tilni almshtirish')
 async def change_language(message: Message) -> None:
     await message.answer(_('Tilni tanlang  👇🏻'), reply_markup=lang_commands())
 
@@ -49,9 +46,9 @@ async def language_handler(message: Message) -> None:
     await change_language(message)
 
 
-@main_router.callback_query(F.data.startswith('lang_'))
-async def languages(callback: CallbackQuery, state: FSMContext) -> None:
-    lang_code = callback.data.split('lang_')[-1]
+@callbacks.handler(Language)
+async def languages(callback: CallbackQuery, callback_data: Language, state: FSMContext) -> None:
+    lang_code = callback_data.code
     await state.update_data(locale=lang_code)
     lang_map = {
         'uz': _('Uzbek', locale=lang_code),
@@ -66,24 +63,30 @@ async def languages(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.message.answer(text=msg, reply_markup=main_buttons(locale=lang_code))
 
 
-@main_router.message(F.text == __("🔵 Biz ijtimoyi tarmoqlarda"))
+@intents.handler("🔵 Biz ijtimoyi tarmoqlarda")
 async def social_handler(message: Message) -> None:
     await message.answer('Biz ijtimoiy tarmoqlarda', reply_markup=main_links_buttons())
 
 
-@main_router.message(F.text == __("📚 Kitoblar"))
+@intents.handler("📚 Kitoblar")
 async def books_handler(message: Message) -> None:
     await message.answer(_('Categoriyalardan birini tanlang 👇🏻'),
                          reply_markup=await show_category(message.from_user.id))
 
 
-@main_router.callback_query(F.data.startswith('orqaga'))
+@callbacks.handler(BackToCategories)
 async def back_handler(callback: CallbackQuery):
     await callback.message.edit_text(_('Categoriyalardan birini tanlang 👇🏻'),
                                      reply_markup=await show_category(callback.from_user.id))
 
 
-@main_router.message(F.text == __("📞 Biz bilan bog'lanish"))
+@callbacks.handler(CategoriesPage)
+async def categories_page_handler(callback: CallbackQuery, callback_data: CategoriesPage):
+    await callback.message.edit_reply_markup(reply_markup=await show_category(
+        callback.from_user.id, callback_data.cursor, callback_data.back))
+
+
+@intents.handler("📞 Biz bilan bog'lanish")
 async def contact_us_handler(message: Message) -> None:
     text = _(
         """
@@ -97,30 +100,32 @@ async def contact_us_handler(message: Message) -> None:
     await message.answer(text=text, parse_mode=ParseMode.HTML)
 
 
-@main_router.callback_query(F.data.startswith('category_name_'))
-async def category_handler(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(CategoryOpen)
+async def category_handler(callback: CallbackQuery, callback_data: CategoryOpen, state: FSMContext):
     await state.set_state(CountState.count)
     await state.update_data(count=1)
-    category_id = int(callback.data.split('category_name_')[-1])
-    categories = await Category.get_all()
-    category = next((cat for cat in categories if cat.id == category_id), None)
+    category_id = callback_data.id
+    category = await catalog.category(category_id)
     if category is None:
         await callback.message.edit_text(text="Categoriya topilmadi!", reply_markup=None)
         return
-    products = await Product.get_products_by_category_id(category_id=category_id)
-    ikb = InlineKeyboardBuilder()
-    for product in products:
-        ikb.add(InlineKeyboardButton(text=product.title, callback_data=f"product_name_{product.id}"))
-    ikb.add(InlineKeyboardButton(text=_("◀️ orqaga"), callback_data='orqaga'))
-    ikb.adjust(2, repeat=True)
-    await callback.message.edit_text(text=f"{category.name}", reply_markup=ikb.as_markup())
-
-
-@main_router.callback_query(F.data.startswith('product_name_'))
-async def product_handler(callback: CallbackQuery):
-    product_id = int(callback.data.split('product_name_')[-1])
-    product = await Product.get(product_id)
-    ikb = make_plus_minus(1, str(product.id))
+    await callback.message.edit_text(text=f"{category.name}", reply_markup=await catalog.products_keyboard(category_id))
+
+
+@callbacks.handler(ProductsPage)
+async def products_page_handler(callback: CallbackQuery, callback_data: ProductsPage):
+    await callback.message.edit_reply_markup(reply_markup=await catalog.products_keyboard(
+        callback_data.category_id, callback_data.cursor, callback_data.back))
+
+
+@callbacks.handler(ProductOpen)
+async def product_handler(callback: CallbackQuery, callback_data: ProductOpen):
+    product = await Product.get(callback_data.id)
+    ikb = make_plus_minus(1, product.id)
     await callback.message.delete()
-    await callback.message.answer_photo(photo=FSInputFile(product.image), caption=product.description,
-                                        reply_markup=ikb.as_markup())
+    await answer_product_photo(callback.message, product, reply_markup=ikb.as_markup())
+
+
+@callbacks.handler(Noop)
+async def noop_handler(callback: CallbackQuery):
+    await callback.answer()
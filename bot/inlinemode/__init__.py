@@ -1 +1,2 @@
+from bot.inlinemode.search_index import search_index
 from bot.inlinemode.search_inline import inline_router
@@ -0,0 +1,226 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import nsmallest
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Product, Category, database
+
+_APOSTROPHES = str.maketrans({"ʻ": "'", "ʼ": "'", "‘": "'", "’": "'", "`": "'"})
+_TOKEN_RE = re.compile(r"[\w']+")
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize(text: str) -> str:
+    """Casefold, unify apostrophes (o‘zbek / o'zbek) and collapse punctuation to single spaces."""
+    text = unicodedata.normalize('NFKC', text or '').translate(_APOSTROPHES).casefold()
+    return ' '.join(_TOKEN_RE.findall(text))
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IndexedProduct(NamedTuple):
+    id: int
+    title: str
+    description: str
+    price: float
+    category_id: int
+    image: str
+
+
+class SearchIndex:
+    """In-memory index over product titles and descriptions for inline search.
+
+    Titles are indexed by trigrams for substring matches, titles and descriptions
+    by whole tokens for prefix matches (a sorted vocabulary is bisected for the
+    prefix range). Results are ranked: exact title, title prefix, title word
+    prefix, title substring, every query word prefixing a title word, and last
+    description-only matches.
+    """
+
+    def __init__(self):
+        self._products: dict[int, IndexedProduct] = {}
+        self._titles: dict[int, str] = {}
+        self._grams: dict[str, set[int]] = defaultdict(set)
+        self._tokens: dict[str, set[int]] = defaultdict(set)
+        self._vocabulary: list[str] = []
+        self._sorted_titles: list[str] = []
+        self._by_title: list[int] = []
+        self._dirty = False
+        self.version = 0
+
+    def __len__(self):
+        return len(self._products)
+
+    def __contains__(self, product_id):
+        return product_id in self._products
+
+    def get(self, product_id):
+        return self._products.get(product_id)
+
+    async def load(self, session: AsyncSession = None):
+        query = select(Product.id, Product.title, Product.description, Product.price, Product.category_id,
+                       Product.image)
+        async with database.get_session(session) as session:
+            rows = (await session.execute(query)).all()
+        self.clear()
+        for row in rows:
+            self.add(row)
+
+    async def sync(self, product_ids=(), category_ids=(), session: AsyncSession = None):
+        """Re-read the given products and drop products of categories that no longer exist."""
+        async with database.get_session(session) as session:
+            if product_ids:
+                query = select(Product.id, Product.title, Product.description, Product.price, Product.category_id,
+                               Product.image).where(Product.id.in_(product_ids))
+                rows = (await session.execute(query)).all()
+                for row in rows:
+                    self.add(row)
+                for product_id in set(product_ids) - {row.id for row in rows}:
+                    self.remove(product_id)
+            if category_ids:
+                query = select(Category.id).where(Category.id.in_(category_ids))
+                existing = set((await session.execute(query)).scalars().all())
+                for category_id in set(category_ids) - existing:
+                    self.remove_category(category_id)
+
+    async def on_invalidate(self, payload):
+        if payload is None:
+            await self.load()
+        else:
+            await self.sync(payload.get('products', ()), payload.get('categories', ()))
+
+    def clear(self):
+        self._products.clear()
+        self._titles.clear()
+        self._grams.clear()
+        self._tokens.clear()
+        self._touch()
+
+    def add(self, product):
+        if product.id in self._products:
+            self.remove(product.id)
+        entry = IndexedProduct(product.id, product.title, product.description or '', product.price,
+                               product.category_id, product.image)
+        title = normalize(entry.title)
+        product_id, grams, tokens = entry.id, self._grams, self._tokens
+        self._products[product_id] = entry
+        self._titles[product_id] = title
+        for gram in trigrams(title):
+            grams[gram].add(product_id)
+        for token in self._entry_tokens(title, entry.description):
+            tokens[token].add(product_id)
+        self._touch()
+
+    def remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        title = self._titles.pop(product_id)
+        self._discard(self._grams, trigrams(title), product_id)
+        self._discard(self._tokens, self._entry_tokens(title, entry.description), product_id)
+        self._touch()
+
+    def remove_category(self, category_id):
+        for product_id in [p.id for p in self._products.values() if p.category_id == category_id]:
+            self.remove(product_id)
+
+    def search(self, query: str, limit: int = None) -> list[IndexedProduct]:
+        self._refresh()
+        query = normalize(query)
+        if not query:
+            ids = self._by_title if limit is None else self._by_title[:limit]
+            return [self._products[product_id] for product_id in ids]
+
+        if limit is not None:
+            # Titles starting with the query rank first and already come in
+            # (rank, title) order, so short queries are usually answered here.
+            head = self._title_prefix_ids(query, limit)
+            if len(head) == limit:
+                return [self._products[product_id] for product_id in head]
+
+        words = query.split()
+        candidates = self._title_substring_ids(query) | self._word_prefix_ids(words)
+        ranked = ((self._rank(product_id, query, words), self._titles[product_id], product_id)
+                  for product_id in candidates)
+        ranked = sorted(ranked) if limit is None else nsmallest(limit, ranked)
+        return [self._products[product_id] for *_, product_id in ranked]
+
+    @staticmethod
+    def _entry_tokens(title, description):
+        return set(title.split()) | set(normalize(description).split())
+
+    @staticmethod
+    def _discard(postings, keys, product_id):
+        for key in keys:
+            ids = postings.get(key)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del postings[key]
+
+    def _touch(self):
+        self._dirty = True
+        self.version += 1
+
+    def _refresh(self):
+        if self._dirty:
+            self._vocabulary = sorted(self._tokens)
+            self._by_title = sorted(self._products, key=lambda product_id: (self._titles[product_id], product_id))
+            self._sorted_titles = [self._titles[product_id] for product_id in self._by_title]
+            self._dirty = False
+
+    def _title_prefix_ids(self, query, limit):
+        start = bisect_left(self._sorted_titles, query)
+        end = min(bisect_left(self._sorted_titles, query + _MAX_CHAR, start), start + limit)
+        return self._by_title[start:end]
+
+    def _title_substring_ids(self, query):
+        if len(query) < 3:
+            return set()
+        postings = sorted((self._grams.get(gram, ()) for gram in trigrams(query)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        ids = set(postings[0])
+        for other in postings[1:]:
+            ids &= other
+            if not ids:
+                return ids
+        return {product_id for product_id in ids if query in self._titles[product_id]}
+
+    def _word_prefix_ids(self, words):
+        ids = None
+        for word in sorted(words, key=len, reverse=True):
+            matched = set()
+            start = bisect_left(self._vocabulary, word)
+            end = bisect_left(self._vocabulary, word + _MAX_CHAR, start)
+            for i in range(start, end):
+                matched |= self._tokens[self._vocabulary[i]]
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                return set()
+        return ids or set()
+
+    def _rank(self, product_id, query, words):
+        title = self._titles[product_id]
+        if title == query:
+            return 0
+        if title.startswith(query):
+            return 1
+        if f' {query}' in f' {title}':
+            return 2
+        if query in title:
+            return 3
+        title_words = title.split()
+        if all(any(token.startswith(word) for token in title_words) for word in words):
+            return 4
+        return 5
+
+
+search_index = SearchIndex()
@@ -1,11 +1,17 @@
 from aiogram import Router
 from aiogram.types import InlineQuery, InlineQueryResultArticle, \
-    InputTextMessageContent, Message, FSInputFile
+    InputTextMessageContent, Message
 
+from bot.inlinemode.search_index import search_index, normalize, IndexedProduct
 from bot.keyboards import make_plus_minus
+from bot.utils.cache import TTLCache
+from bot.utils.media import answer_product_photo
+from bot.utils.thumbnails import thumbnails
+from config import conf
 from db import Product
 
 inline_router = Router()
+inline_pages = TTLCache(maxsize=2048, ttl=conf.bot.INLINE_PAGE_TTL)
 
 
 @inline_router.message(lambda msg: msg.text is not None and (msg.text.split()[-1]).isdigit())
@@ -14,35 +20,45 @@ async def answer_inline_query(message: Message):
     product = await Product.get(id_=product_id)
     ikb = make_plus_minus(1, str(product_id))
     await message.delete()
-    await message.answer_photo(photo=FSInputFile(product.image), caption=product.description,
-                               reply_markup=ikb.as_markup())
+    await answer_product_photo(message, product, reply_markup=ikb.as_markup())
+
+
+def inline_result(product: IndexedProduct) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=str(product.id),
+        title=product.title,
+        input_message_content=InputTextMessageContent(
+            message_text=(
+                f"<i>{product.description}</i>\n\n"
+                f"Buyurtma qilish uchun: @worldbooks_storebot\n\n"
+                f"book_id: {product.id}"
+            )
+        ),
+        thumbnail_url=thumbnails.url(product),
+        description=f"World Books Store\n💵 Narxi: {product.price} sum",
+    )
+
+
+def inline_page(query: str, offset: int) -> tuple[list[InlineQueryResultArticle], str]:
+    page_size = conf.bot.INLINE_PAGE_SIZE
+    key = (search_index.version, normalize(query), offset)
+    page = inline_pages.get(key)
+    if page is None:
+        products = search_index.search(query, limit=offset + page_size + 1)
+        results = [inline_result(product) for product in products[offset:offset + page_size]]
+        next_offset = str(offset + page_size) if len(products) > offset + page_size else ''
+        page = (results, next_offset)
+        inline_pages.set(key, page)
+    return page
 
 
 @inline_router.inline_query()
 async def user_inline_handler(inline_query: InlineQuery):
-    products = await Product.get_all()
-    query = inline_query.query.lower()
-    filtered_products = [
-        product for product in products
-        if query in product.title.lower()
-    ]
-    count = 0
-    inline_mode_books_list = []
-    for product in filtered_products:
-        count += 1
-        inline_mode_books_list.append(InlineQueryResultArticle(
-            id=str(product.id),
-            title=product.title,
-            input_message_content=InputTextMessageContent(
-                message_text=(
-                    f"<i>{product.description}</i>\n\n"
-                    f"Buyurtma qilish uchun: @worldbooks_storebot\n\n"
-                    f"book_id: {product.id}"
-                )
-            ),
-            thumbnail_url="https://www.google.com/imgres?q=image&imgurl=https%3A%2F%2Fdfstudio-d420.kxcdn.com%2Fwordpress%2Fwp-content%2Fuploads%2F2019%2F06%2Fdigital_camera_photo-1080x675.jpg&imgrefurl=https%3A%2F%2Fwww.dfstudio.com%2Fdigital-image-size-and-resolution-what-do-you-need-to-know%2F&docid=KEFtss0dYCDpzM&tbnid=0kl2WrGN8BrkhM&vet=12ahUKEwjW3IiD85WKAxWWExAIHZidKioQM3oECF0QAA..i&w=1080&h=675&hcb=2&ved=2ahUKEwjW3IiD85WKAxWWExAIHZidKioQM3oECF0QAA",
-            description=f"World Books Store\n💵 Narxi: {product.price} sum",
-        ))
-        if count == 50:
-            break
-    await inline_query.answer(inline_mode_books_list)
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    results, next_offset = inline_page(inline_query.query, offset)
+    await inline_query.answer(
+        results,
+        cache_time=conf.bot.INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset,
+    )
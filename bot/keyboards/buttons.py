@@ -3,7 +3,9 @@ from aiogram.utils.i18n import gettext as _
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
 from bot.config.conf import LINKS
-from db import Category, Basket
+from bot.utils.callbacks import Language, ShowBasket, CountChange, Noop, ShowCategories, AddToBasket
+from bot.utils.catalog import catalog
+from db import Basket
 
 
 def main_links_buttons() -> InlineKeyboardMarkup:
@@ -18,7 +20,8 @@ def admin_buttons() -> ReplyKeyboardMarkup:
     rkb = ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text='📚 Kitoblar')],
                   [KeyboardButton(text='Product ➕'), KeyboardButton(text='Category ➕')],
-                  [KeyboardButton(text="Product ➖ (🗑 o'chirish)"), KeyboardButton(text="Category ➖ (🗑 o'chirish)")]],
+                  [KeyboardButton(text="Product ➖ (🗑 o'chirish)"), KeyboardButton(text="Category ➖ (🗑 o'chirish)")],
+                  [KeyboardButton(text='📣 Xabar yuborish')]],
         # [KeyboardButton(text='Social Link ➕'), KeyboardButton(text="Social Link ➖ (🗑 o'chirish)")]],
         resize_keyboard=True)
     return rkb
@@ -26,33 +29,32 @@ def admin_buttons() -> ReplyKeyboardMarkup:
 
 def lang_commands():
     ikb = InlineKeyboardBuilder()
-    ikb.row(InlineKeyboardButton(text='Uz 🇺🇿', callback_data='lang_uz'),
-            InlineKeyboardButton(text='En 🇺🇸', callback_data='lang_en'),
-            InlineKeyboardButton(text='Tur 🇹🇷', callback_data="lang_tur"),
-            InlineKeyboardButton(text='Ru 🇷🇺', callback_data='lang_ru'),
-            InlineKeyboardButton(text='Ko 🇰🇷', callback_data='lang_ko'))
+    ikb.row(InlineKeyboardButton(text='Uz 🇺🇿', callback_data=Language(code='uz').pack()),
+            InlineKeyboardButton(text='En 🇺🇸', callback_data=Language(code='en').pack()),
+            InlineKeyboardButton(text='Tur 🇹🇷', callback_data=Language(code='tur').pack()),
+            InlineKeyboardButton(text='Ru 🇷🇺', callback_data=Language(code='ru').pack()),
+            InlineKeyboardButton(text='Ko 🇰🇷', callback_data=Language(code='ko').pack()))
     return ikb.as_markup()
 
 
-async def show_category(user_telegram_id):
-    ikb = InlineKeyboardBuilder()
-    categories = await Category.get_all()
+async def show_category(user_telegram_id, cursor=0, back=False):
     amount = await Basket.count_grouped_by_user_telegram_id(user_telegram_id)
-    for category in categories:
-        ikb.add(InlineKeyboardButton(text=category.name, callback_data=f"category_name_{category.id}"))
-    ikb.add(InlineKeyboardButton(text=_('🔍 Qidirish'), switch_inline_query_current_chat=''))
-    ikb.add(InlineKeyboardButton(text=f'🛒 Savat ({(amount)})', callback_data='savat'))
-    ikb.adjust(2, repeat=True)
-    return ikb.as_markup()
+    rows = await catalog.category_rows(cursor, back)
+    return InlineKeyboardMarkup(inline_keyboard=[
+        *rows,
+        [InlineKeyboardButton(text=_('🔍 Qidirish'), switch_inline_query_current_chat=''),
+         InlineKeyboardButton(text=f'🛒 Savat ({(amount)})', callback_data=ShowBasket().pack())],
+    ])
 
 
-def make_plus_minus(quantity, product_id):
+def make_plus_minus(quantity, product_id: int):
     ikb = InlineKeyboardBuilder()
-    ikb.row(InlineKeyboardButton(text="➖", callback_data="change-" + product_id),
-            InlineKeyboardButton(text=str(quantity), callback_data="number"),
-            InlineKeyboardButton(text="➕", callback_data="change+" + product_id))
-    ikb.row(InlineKeyboardButton(text=_("◀️Orqaga"), callback_data="categoryga"),
-            InlineKeyboardButton(text=_('🛒 Savatga qo\'shish'), callback_data=f"add_to_card_{product_id}_{quantity}"))
+    ikb.row(InlineKeyboardButton(text="➖", callback_data=CountChange(product_id=product_id, delta=-1).pack()),
+            InlineKeyboardButton(text=str(quantity), callback_data=Noop().pack()),
+            InlineKeyboardButton(text="➕", callback_data=CountChange(product_id=product_id, delta=1).pack()))
+    ikb.row(InlineKeyboardButton(text=_("◀️Orqaga"), callback_data=ShowCategories().pack()),
+            InlineKeyboardButton(text=_('🛒 Savatga qo\'shish'),
+                                 callback_data=AddToBasket(product_id=product_id, quantity=quantity).pack()))
     return ikb
 
 
@@ -0,0 +1,2 @@
+from bot.middlewares.database import DatabaseSessionMiddleware
+from bot.middlewares.startup import ColdStartMiddleware
@@ -0,0 +1,21 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db import database
+
+
+class DatabaseSessionMiddleware(BaseMiddleware):
+    """Opens one ``AsyncSession`` per update and injects it as ``session``."""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        async with database.session() as session:
+            with database.bind(session):
+                data['session'] = session
+                return await handler(event, data)
@@ -0,0 +1,51 @@
+import logging
+
+from sqlalchemy import select
+
+from bot.config import ADMIN_LIST
+from config import conf
+from db import User, database
+
+
+def configured_admins() -> set[int]:
+    admins = set(ADMIN_LIST)
+    if conf.bot.ADMIN_LIST:
+        admins.update(conf.bot.get_admin_list)
+    return admins
+
+
+class AdminRegistry:
+    """Telegram ids of the admins: users of type ADMIN/SUPER_ADMIN plus the configured list.
+
+    Checked on every private message by ``IsAdmin``, so it is an in-memory set.
+    Roles are only changed in the database by hand, so ``load`` runs at startup
+    and every ``ADMIN_REFRESH_INTERVAL`` seconds, and after an ``admins``
+    message on the invalidation bus or a reconnect to it.
+    """
+
+    def __init__(self):
+        self._admins: frozenset[int] = frozenset(configured_admins())
+
+    def __contains__(self, telegram_id):
+        return telegram_id in self._admins
+
+    def __iter__(self):
+        return iter(sorted(self._admins))
+
+    def __len__(self):
+        return len(self._admins)
+
+    async def load(self):
+        query = select(User.telegram_id).where(User.type.in_([User.Type.ADMIN, User.Type.SUPER_ADMIN]))
+        async with database.get_session() as session:
+            admins = set((await session.execute(query)).scalars().all())
+        admins = frozenset(admins | configured_admins())
+        if admins != self._admins:
+            logging.info("Admins: %s", sorted(admins))
+        self._admins = admins
+
+    async def on_invalidate(self, payload):
+        await self.load()
+
+
+admin_registry = AdminRegistry()
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.utils.callbacks import BroadcastStop
+from config import conf
+from db import Broadcast, User, database
+
+RECIPIENTS_WINDOW = 1000
+MAX_IN_FLIGHT = 50
+CHECKPOINT_INTERVAL = 2
+REPORT_INTERVAL = 10
+LEASE = 60
+
+
+class TokenBucket:
+    """``rate`` sends per second with bursts of at most ``capacity``.
+
+    ``pause`` is used on a 429: nothing is handed out until ``retry_after`` has
+    passed, for every sender sharing the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Refill from the end of the pause, or the idle time before it would come back as a burst.
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def stop_keyboard(broadcast_id) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="⏹ To'xtatish", callback_data=BroadcastStop(id=broadcast_id).pack())
+    ]])
+
+
+class BroadcastRunner:
+    """Copies the admin's message to every user after ``broadcast.last_user_id``.
+
+    Sends are concurrent and finish out of order, so the checkpoint is the
+    watermark below which every user is done; after a crash at most the last
+    couple of seconds of recipients get the message again.
+    """
+
+    def __init__(self, bot: Bot, broadcast: Broadcast, owner: str, bucket: TokenBucket):
+        self.bot = bot
+        self.broadcast = broadcast
+        self.owner = owner
+        self.bucket = bucket
+        self.status = Broadcast.Status.RUNNING
+        self.sent = broadcast.sent
+        self.failed = broadcast.failed
+        self.blocked = broadcast.blocked
+        self._watermark = broadcast.last_user_id
+        self._in_flight: OrderedDict[int, bool] = OrderedDict()
+        self._slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self._started = time.monotonic()
+        self._done_at_start = self.done
+
+    @property
+    def done(self):
+        return self.sent + self.failed + self.blocked
+
+    @property
+    def speed(self):
+        return (self.done - self._done_at_start) / max(time.monotonic() - self._started, 1e-6)
+
+    async def run(self):
+        # Started from a handler the task inherits its context; the handler's
+        # session must not be shared with a broadcast that outlives it.
+        with database.bind(None):
+            await self._run()
+
+    async def _run(self):
+        tasks = set()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        after_id = self._watermark
+        try:
+            while self.status == Broadcast.Status.RUNNING:
+                rows = await User.recipients(after_id, RECIPIENTS_WINDOW)
+                if not rows:
+                    break
+                for row in rows:
+                    await self._slots.acquire()
+                    await self.bucket.acquire()
+                    if self.status != Broadcast.Status.RUNNING:
+                        self._slots.release()
+                        break
+                    self._in_flight[row.id] = False
+                    task = asyncio.create_task(self._send(row))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                after_id = rows[-1].id
+            if tasks:
+                await asyncio.wait(tasks)
+        except asyncio.CancelledError:
+            # Shutdown: let the requests already sent finish, then hand the lease back.
+            if tasks:
+                await asyncio.wait(tasks, timeout=5)
+            heartbeat.cancel()
+            await self._checkpoint(heartbeat_at=None)
+            raise
+        heartbeat.cancel()
+
+        if self.status == Broadcast.Status.RUNNING:
+            self.status = Broadcast.Status.DONE
+            await self._checkpoint(status=self.status)
+        else:
+            await self._checkpoint()
+        logging.info(f"Broadcast {self.broadcast.id} {self.status.value}: sent {self.sent}, "
+                     f"blocked {self.blocked}, failed {self.failed}, {self.speed:.1f} msg/s")
+        await self._report()
+
+    async def _send(self, row):
+        errors = 0
+        try:
+            while True:
+                try:
+                    await self.bot.copy_message(chat_id=row.telegram_id, from_chat_id=self.broadcast.from_chat_id,
+                                                message_id=self.broadcast.message_id)
+                    self.sent += 1
+                    return
+                except TelegramRetryAfter as e:
+                    self.bucket.pause(e.retry_after)
+                    await self.bucket.acquire()
+                except TelegramForbiddenError:
+                    self.blocked += 1
+                    return
+                except TelegramBadRequest:
+                    self.failed += 1
+                    return
+                except Exception as e:
+                    errors += 1
+                    if errors >= 3:
+                        logging.warning(f"Broadcast {self.broadcast.id} to {row.telegram_id} failed: {e}")
+                        self.failed += 1
+                        return
+                    await asyncio.sleep(errors)
+        finally:
+            self._finish(row.id)
+            self._slots.release()
+
+    def _finish(self, user_id):
+        self._in_flight[user_id] = True
+        while self._in_flight:
+            first, finished = next(iter(self._in_flight.items()))
+            if not finished:
+                break
+            self._in_flight.popitem(last=False)
+            self._watermark = first
+
+    async def _checkpoint(self, **values):
+        return await Broadcast.checkpoint(self.broadcast.id, self.owner, last_user_id=self._watermark,
+                                          sent=self.sent, failed=self.failed, blocked=self.blocked, **values)
+
+    async def _heartbeat(self):
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            try:
+                status = await self._checkpoint()
+            except Exception as e:
+                logging.warning(f"Broadcast {self.broadcast.id} checkpoint failed: {e}")
+                continue
+            if status is None:
+                logging.warning(f"Broadcast {self.broadcast.id} lease lost, stopping")
+                self.status = Broadcast.Status.CANCELLED
+            elif status != Broadcast.Status.RUNNING:
+                self.status = status
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                last_report = time.monotonic()
+                await self._report()
+
+    async def _report(self):
+        if not self.broadcast.progress_message_id:
+            return
+        titles = {
+            Broadcast.Status.RUNNING: "📣 Xabar yuborilmoqda...",
+            Broadcast.Status.DONE: "✅ Xabar yuborish yakunlandi",
+            Broadcast.Status.CANCELLED: "⏹ Xabar yuborish to'xtatildi",
+        }
+        text = (
+            f"{titles[self.status]}\n\n"
+            f"📊 {self.done}/{self.broadcast.total}\n"
+            f"✅ Yuborildi: {self.sent}\n"
+            f"🚫 Bloklagan: {self.blocked}\n"
+            f"❌ Xatolik: {self.failed}\n"
+            f"⚡️ Tezlik: {self.speed:.1f} xabar/s"
+        )
+        markup = stop_keyboard(self.broadcast.id) if self.status == Broadcast.Status.RUNNING else None
+        try:
+            await self.bot.edit_message_text(text=text, chat_id=self.broadcast.admin_telegram_id,
+                                             message_id=self.broadcast.progress_message_id, reply_markup=markup)
+        except Exception as e:
+            logging.debug(f"Broadcast {self.broadcast.id} report not updated: {e}")
+
+
+class BroadcastManager:
+    """Runs the broadcasts owned by this process and takes over the ones other workers abandoned.
+
+    Only one broadcast runs at a time, so a single token bucket keeps the bot
+    under Telegram's global limit.
+    """
+
+    def __init__(self, rate: float):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.bucket = TokenBucket(rate)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(self, bot: Bot, admin_telegram_id, from_chat_id, message_id) -> Broadcast | None:
+        broadcast = await Broadcast.start(
+            self.owner,
+            admin_telegram_id=admin_telegram_id,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            total=await User.count(),
+        )
+        if broadcast is None:
+            return None
+        progress = await bot.send_message(admin_telegram_id, "📣 Xabar yuborilmoqda...",
+                                          reply_markup=stop_keyboard(broadcast.id))
+        broadcast.progress_message_id = progress.message_id
+        # None when the lease was lost meanwhile: then the worker that took it over sends the broadcast.
+        if await Broadcast.checkpoint(broadcast.id, self.owner, progress_message_id=progress.message_id):
+            self._run(bot, broadcast)
+        return broadcast
+
+    async def resume(self, bot: Bot):
+        while broadcast := await Broadcast.claim(self.owner, LEASE):
+            logging.info(f"Resuming broadcast {broadcast.id} after user {broadcast.last_user_id}")
+            self._run(bot, broadcast)
+
+    def _run(self, bot: Bot, broadcast: Broadcast):
+        task = asyncio.create_task(BroadcastRunner(bot, broadcast, self.owner, self.bucket).run())
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast.id, None))
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcasts = BroadcastManager(conf.bot.BROADCAST_RATE)
@@ -0,0 +1,214 @@
+"""Callback-data schema of every inline button, and a router dispatching on its prefix.
+
+Payloads are packed by aiogram ``CallbackData`` factories as
+``prefix:field:field``. A prefix ends with the version of its layout: when the
+fields of a factory change, give it a new prefix and convert the old layout in
+``legacy_callback``, so buttons already sent in chats keep working.
+"""
+from enum import Enum
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject, FilterObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+SEPARATOR = ':'
+
+
+class Language(CallbackData, prefix='lg1'):
+    code: str
+
+
+class CategoriesPage(CallbackData, prefix='cs1'):
+    cursor: int
+    back: bool = False
+
+
+class CategoryOpen(CallbackData, prefix='c1'):
+    id: int
+
+
+class ProductsPage(CallbackData, prefix='ps1'):
+    category_id: int
+    cursor: int
+    back: bool = False
+
+
+class ProductOpen(CallbackData, prefix='p1'):
+    id: int
+
+
+class CountChange(CallbackData, prefix='cc1'):
+    product_id: int
+    delta: int
+
+
+class Noop(CallbackData, prefix='x1'):
+    pass
+
+
+class AddToBasket(CallbackData, prefix='ab1'):
+    product_id: int
+    quantity: int
+
+
+class BackToCategories(CallbackData, prefix='bc1'):
+    """Edit the current message into the category menu."""
+
+
+class ShowCategories(CallbackData, prefix='sc1'):
+    """Replace the current message with a new category menu."""
+
+
+class ShowBasket(CallbackData, prefix='sb1'):
+    pass
+
+
+class ClearBasket(CallbackData, prefix='cb1'):
+    pass
+
+
+class Checkout(CallbackData, prefix='co1'):
+    pass
+
+
+class CancelCheckout(CallbackData, prefix='cx1'):
+    pass
+
+
+class PlaceOrder(CallbackData, prefix='po1'):
+    phone: str
+
+
+class AdminOrder(CallbackData, prefix='ao1'):
+    accept: bool
+    user_id: int
+    order_id: int
+
+
+class OrdersPage(CallbackData, prefix='os1'):
+    newer: bool
+    micros: int
+    order_id: int
+
+
+class AdminList(str, Enum):
+    """The admin screens that list categories or products to choose from."""
+    PICK_CATEGORY = 'pc'
+    DELETE_CATEGORY = 'dc'
+    DELETE_PRODUCT = 'dp'
+
+
+class AdminPage(CallbackData, prefix='ag1'):
+    kind: AdminList
+    cursor: int
+    back: bool = False
+
+
+class PickCategory(CallbackData, prefix='pk1'):
+    id: int
+
+
+class DeleteCategory(CallbackData, prefix='dc1'):
+    id: int
+
+
+class DeleteProduct(CallbackData, prefix='dp1'):
+    id: int
+
+
+class BroadcastConfirm(CallbackData, prefix='bb1'):
+    send: bool
+
+
+class BroadcastStop(CallbackData, prefix='bs1'):
+    id: int
+
+
+def _admin_order(data: str):
+    action, user_id, _basket_user_id, order_id = data.split('-')
+    return AdminOrder(accept=action == 'from_admin_order_accept', user_id=int(user_id), order_id=int(order_id))
+
+
+LEGACY_EXACT = {
+    'savat': ShowBasket(),
+    'orqaga': BackToCategories(),
+    'categoryga': ShowCategories(),
+    'clear': ClearBasket(),
+    'confirm': Checkout(),
+    'canceled_order': CancelCheckout(),
+    'number': Noop(),
+}
+
+LEGACY_PREFIXES = (
+    ('lang_', lambda data: Language(code=data[len('lang_'):])),
+    ('category_name_', lambda data: CategoryOpen(id=int(data.rsplit('_', 1)[1]))),
+    ('product_name_', lambda data: ProductOpen(id=int(data.rsplit('_', 1)[1]))),
+    ('add_to_card_', lambda data: AddToBasket(product_id=int(data.split('_')[-2]), quantity=int(data.split('_')[-1]))),
+    ('change-', lambda data: CountChange(product_id=int(data[len('change-'):]), delta=-1)),
+    ('change+', lambda data: CountChange(product_id=int(data[len('change+'):]), delta=1)),
+    ('confirm_order_', lambda data: PlaceOrder(phone=data.split('_')[-1])),
+    ('from_admin_', _admin_order),
+)
+
+
+def legacy_callback(data: str) -> CallbackData | None:
+    """The payload of a button sent before the typed schema, converted to its factory; None if unknown."""
+    if data in LEGACY_EXACT:
+        return LEGACY_EXACT[data]
+    for prefix, convert in LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            try:
+                return convert(data)
+            except (ValueError, TypeError):
+                return None
+    return None
+
+
+class CallbackRouter:
+    """Dispatches callback queries by the prefix of their data with one dict lookup.
+
+    ``handler(Factory, *filters)`` registers a handler; it receives the unpacked
+    payload as ``callback_data``, like with ``Factory.filter()``. Only the
+    handlers of that prefix have their filters checked, so adding handlers does
+    not make any callback slower.
+    """
+
+    def __init__(self, name: str = 'callbacks'):
+        self.router = Router(name=name)
+        self.router.callback_query.register(self._dispatch, self._match)
+        self._routes: dict[str, tuple[type[CallbackData], list[HandlerObject]]] = {}
+
+    def handler(self, factory: type[CallbackData], *filters):
+        def decorator(callback):
+            _, handlers = self._routes.setdefault(factory.__prefix__, (factory, []))
+            handlers.append(HandlerObject(callback=callback, filters=[FilterObject(f) for f in filters]))
+            return callback
+        return decorator
+
+    def _match(self, callback: CallbackQuery):
+        if not callback.data:
+            return False
+        route = self._routes.get(callback.data.split(SEPARATOR, 1)[0])
+        if route is None:
+            callback_data = legacy_callback(callback.data)
+            if callback_data is None or callback_data.__prefix__ not in self._routes:
+                return False
+            route = self._routes[callback_data.__prefix__]
+        else:
+            try:
+                callback_data = route[0].unpack(callback.data)
+            except (ValueError, TypeError):
+                return False
+        return {'callback_data': callback_data, 'callback_handlers': route[1]}
+
+    async def _dispatch(self, callback: CallbackQuery, callback_handlers: list[HandlerObject], **data):
+        for handler in callback_handlers:
+            passed, kwargs = await handler.check(callback, **data)
+            if passed:
+                return await handler.call(callback, **kwargs)
+        raise SkipHandler
+
+
+callbacks = CallbackRouter()
@@ -0,0 +1,164 @@
+from typing import NamedTuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.i18n import gettext as _, get_i18n
+from sqlalchemy import select
+
+from bot.utils.cache import TTLCache
+from bot.utils.callbacks import CategoriesPage, CategoryOpen, ProductsPage, ProductOpen, BackToCategories
+from bot.utils.invalidation import invalidation_bus
+from config import conf
+from db import Category, Product, database
+
+MISSING = object()
+
+
+class CatalogCategory(NamedTuple):
+    id: int
+    name: str
+
+
+class CatalogProduct(NamedTuple):
+    id: int
+    title: str
+
+
+class CatalogPage(NamedTuple):
+    """Items of one page; ``prev``/``next`` are the cursors of the neighbour pages, None at the ends."""
+    items: list
+    prev: int | None
+    next: int | None
+
+
+def page_rows(page: CatalogPage, item_data, page_data, columns: int = 2) -> list[list[InlineKeyboardButton]]:
+    """Item buttons ``columns`` per row, then a ⬅️/➡️ row; ``page_data(cursor, back)`` packs the page callbacks."""
+    buttons = [InlineKeyboardButton(text=item[1], callback_data=item_data(item)) for item in page.items]
+    rows = [buttons[i:i + columns] for i in range(0, len(buttons), columns)]
+    nav = []
+    if page.prev is not None:
+        nav.append(InlineKeyboardButton(text='⬅️', callback_data=page_data(page.prev, True)))
+    if page.next is not None:
+        nav.append(InlineKeyboardButton(text='➡️', callback_data=page_data(page.next, False)))
+    if nav:
+        rows.append(nav)
+    return rows
+
+
+class CatalogCache:
+    """Pages of categories and products and their keyboards, kept in memory.
+
+    Screens show keyset pages of ``page_size`` rows selecting only ``id`` and the
+    name, so each costs one small query however big the catalog is. Admin writes
+    call ``invalidate`` which clears this process and broadcasts to the others, so
+    browsing the catalog costs no SQL in the steady state. Single categories,
+    pages and keyboards are LRU caches of ``maxsize`` entries each.
+    """
+
+    def __init__(self, page_size: int, maxsize: int = 4096, ttl: int = 3600):
+        self.page_size = page_size
+        self._categories: dict[int, CatalogCategory] | None = None
+        self._category = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._keyboards = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+
+    async def categories(self) -> list[CatalogCategory]:
+        """Every category, for bulk work such as imports; screens use ``category_page``."""
+        if self._categories is None:
+            generation = self._generation
+            async with database.get_session() as session:
+                rows = (await session.execute(select(Category.id, Category.name).order_by(Category.id))).all()
+            categories = {row.id: CatalogCategory(row.id, row.name) for row in rows}
+            if generation != self._generation:
+                return list(categories.values())
+            self._categories = categories
+        return list(self._categories.values())
+
+    async def category(self, category_id) -> CatalogCategory | None:
+        category = self._category.get(category_id, MISSING)
+        if category is MISSING:
+            generation = self._generation
+            async with database.get_session() as session:
+                row = (await session.execute(
+                    select(Category.id, Category.name).where(Category.id == category_id))).first()
+            category = CatalogCategory(row.id, row.name) if row else None
+            if generation == self._generation:
+                self._category.set(category_id, category)
+        return category
+
+    async def _page(self, key, model, column, item, cursor, back, where=None) -> CatalogPage:
+        page = self._pages.get(key)
+        if page is None:
+            generation = self._generation
+            rows, has_prev, has_next = await model.keyset_page(column, where=where, cursor=cursor, back=back,
+                                                               limit=self.page_size)
+            if back and not rows:
+                # Everything before the cursor is gone: show the first page instead.
+                rows, has_prev, has_next = await model.keyset_page(column, where=where, limit=self.page_size)
+            items = [item(*row) for row in rows]
+            page = CatalogPage(items, items[0].id if items and has_prev else None,
+                               items[-1].id if items and has_next else None)
+            if generation == self._generation:
+                self._pages.set(key, page)
+        return page
+
+    async def category_page(self, cursor=0, back=False) -> CatalogPage:
+        return await self._page(('categories', cursor, back), Category, Category.name, CatalogCategory,
+                                cursor, back)
+
+    async def product_page(self, category_id=None, cursor=0, back=False) -> CatalogPage:
+        """Products of a category, or of the whole catalog when ``category_id`` is None."""
+        where = None if category_id is None else Product.category_id == category_id
+        return await self._page(('products', category_id, cursor, back), Product, Product.title, CatalogProduct,
+                                cursor, back, where)
+
+    async def category_rows(self, cursor=0, back=False) -> list[list[InlineKeyboardButton]]:
+        """Category buttons of one page followed by the ⬅️/➡️ row."""
+        key = ('categories', cursor, back)
+        rows = self._keyboards.get(key)
+        if rows is None:
+            generation = self._generation
+            rows = page_rows(await self.category_page(cursor, back),
+                             lambda category: CategoryOpen(id=category.id).pack(),
+                             lambda cursor_, back_: CategoriesPage(cursor=cursor_, back=back_).pack())
+            if generation == self._generation:
+                self._keyboards.set(key, rows)
+        return rows
+
+    async def products_keyboard(self, category_id, cursor=0, back=False) -> InlineKeyboardMarkup:
+        """One page of a category's products and the back button."""
+        key = ('products', category_id, cursor, back, get_i18n().current_locale)
+        markup = self._keyboards.get(key)
+        if markup is None:
+            generation = self._generation
+            rows = page_rows(await self.product_page(category_id, cursor, back),
+                             lambda product: ProductOpen(id=product.id).pack(),
+                             lambda cursor_, back_: ProductsPage(category_id=category_id, cursor=cursor_,
+                                                                 back=back_).pack())
+            rows.append([InlineKeyboardButton(text=_("◀️ orqaga"), callback_data=BackToCategories().pack())])
+            markup = InlineKeyboardMarkup(inline_keyboard=rows)
+            if generation == self._generation:
+                self._keyboards.set(key, markup)
+        return markup
+
+    def clear(self):
+        self._generation += 1
+        self._categories = None
+        self._category.clear()
+        self._pages.clear()
+        self._keyboards.clear()
+
+    async def invalidate(self, products=(), categories=()):
+        self.clear()
+        await invalidation_bus.publish('catalog', {'products': list(products), 'categories': list(categories)})
+
+    async def invalidate_all(self):
+        """After bulk changes: every worker drops its catalog and reloads its search index."""
+        self.clear()
+        await invalidation_bus.publish('catalog', None)
+
+    async def on_invalidate(self, payload):
+        self.clear()
+
+
+catalog = CatalogCache(conf.bot.CATALOG_PAGE_SIZE, conf.bot.CATALOG_CACHE_SIZE)
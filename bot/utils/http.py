@@ -0,0 +1,21 @@
+import aiohttp
+
+_session = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Shared client session, so outgoing HTTP reuses pooled keep-alive connections."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return _session
+
+
+async def close_http_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
@@ -0,0 +1,29 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+def _write(path, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_variants(data: bytes, paths: dict[str, str], sizes: dict[str, int], quality: int = 85):
+    """Write the original to ``paths['original']`` and a JPEG fitting ``sizes[name]`` to ``paths[name]``.
+
+    Runs in a worker process of ``MediaStore``; files are written under a
+    temporary name and renamed, so readers never see a partial image.
+    """
+    os.makedirs(os.path.dirname(paths['original']), exist_ok=True)
+    _write(paths['original'], data)
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for name, size in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, 'JPEG', quality=quality, optimize=True)
+            _write(paths[name], buffer.getvalue())
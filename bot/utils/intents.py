@@ -0,0 +1,54 @@
+import logging
+
+from aiogram import F, Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import Message
+from aiogram.utils.i18n import I18n
+
+
+class IntentRouter:
+    """Routes reply-keyboard texts to their handlers with a single dict lookup.
+
+    Handlers are registered under the untranslated button text (the msgid).
+    ``build`` translates every msgid into every locale under ``locales/`` once,
+    so at dispatch time a message costs one lookup, whatever the number of
+    languages and menu items. Handlers get the same keyword arguments as
+    ordinary aiogram handlers.
+    """
+
+    def __init__(self, name: str = 'intents'):
+        self.router = Router(name=name)
+        self.router.message.register(self._dispatch, F.text, self._match)
+        self._handlers: dict[str, CallableObject] = {}
+        self._table: dict[str, str] = {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def handler(self, text: str):
+        def decorator(callback):
+            if text in self._handlers:
+                raise ValueError(f"Intent {text!r} already has a handler")
+            self._handlers[text] = CallableObject(callback)
+            return callback
+        return decorator
+
+    def build(self, i18n: I18n):
+        table = {}
+        for intent in self._handlers:
+            for locale in (i18n.default_locale, *i18n.available_locales):
+                text = i18n.gettext(intent, locale=locale)
+                if table.setdefault(text, intent) != intent:
+                    logging.warning(f"{locale}: {text!r} is the translation of both "
+                                    f"{table[text]!r} and {intent!r}, keeping the first")
+        self._table = table
+
+    def _match(self, message: Message):
+        intent = self._table.get(message.text)
+        return False if intent is None else {'intent': intent}
+
+    async def _dispatch(self, message: Message, intent: str, **data):
+        return await self._handlers[intent].call(message, **data)
+
+
+intents = IntentRouter()
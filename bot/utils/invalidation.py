@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from uuid import uuid4
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from bot.utils.redis_client import get_redis
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations to the other bot processes through Redis pub/sub.
+
+    Publishers apply the change to their own caches and then ``publish``; every other
+    process runs the handlers subscribed to that topic. After a lost connection all
+    handlers are called with ``None`` because messages may have been missed.
+    """
+    CHANNEL = 'bookshop:invalidate'
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._origin = uuid4().hex
+        self._task = None
+
+    def subscribe(self, topic, handler):
+        self._handlers[topic].append(handler)
+
+    async def publish(self, topic, payload=None):
+        redis = get_redis()
+        if redis is None:
+            return
+        message = json.dumps({'origin': self._origin, 'topic': topic, 'payload': payload})
+        try:
+            await redis.publish(self.CHANNEL, message)
+        except RedisConnectionError as e:
+            logging.error(f"Failed to publish {topic} invalidation: {e}")
+
+    async def start(self):
+        if get_redis() is not None and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _dispatch(self, topic, payload):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                await handler(payload)
+            except Exception as e:
+                logging.exception(f"Invalidation handler for {topic} failed: {e}")
+
+    async def _listen(self):
+        reconnect = False
+        while True:
+            try:
+                async with get_redis().pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    if reconnect:
+                        for topic in list(self._handlers):
+                            await self._dispatch(topic, None)
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        try:
+                            data = json.loads(message['data'])
+                            origin, topic, payload = data['origin'], data['topic'], data['payload']
+                        except (ValueError, KeyError, TypeError) as e:
+                            logging.warning(f"Ignoring malformed invalidation {message['data']!r}: {e}")
+                            continue
+                        if origin != self._origin:
+                            await self._dispatch(topic, payload)
+            except RedisConnectionError as e:
+                logging.error(f"Invalidation listener disconnected: {e}")
+                reconnect = True
+                await asyncio.sleep(1)
+
+
+invalidation_bus = InvalidationBus()
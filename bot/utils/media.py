@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, FSInputFile
+from sqlalchemy import select
+
+from bot.utils.images import store_variants
+from config import conf
+from db import Product, database
+
+
+async def answer_product_photo(message: Message, product: Product, reply_markup=None) -> Message:
+    """Send the product photo by its Telegram file_id, uploading from ./media only when needed.
+
+    The file_id of the first upload is stored on the product; if Telegram no longer
+    accepts a stored id the local file is uploaded again and the new id saved.
+    """
+    if product.image_file_id:
+        try:
+            sent = await message.answer_photo(photo=product.image_file_id, caption=product.description,
+                                              reply_markup=reply_markup)
+            if product.image_file_id.startswith('http'):
+                # Imported products may carry an image URL; keep Telegram's file_id after the first send.
+                await Product.update(id_=product.id, image_file_id=sent.photo[-1].file_id)
+            return sent
+        except TelegramBadRequest as e:
+            logging.warning(f"Stale file_id for product {product.id}: {e}")
+
+    if not product.image:
+        return await message.answer(product.description or product.title, reply_markup=reply_markup)
+
+    sent = await message.answer_photo(photo=FSInputFile(product.image), caption=product.description,
+                                      reply_markup=reply_markup)
+    await Product.update(id_=product.id, image_file_id=sent.photo[-1].file_id)
+    return sent
+
+
+def read_file(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class MediaStore:
+    """Content-addressed product images with resized variants.
+
+    An image is stored once per sha256 of its bytes as ``<root>/<ab>/<sha256>.jpg``,
+    next to ``_display`` (sent to Telegram, ``Product.image`` points to it) and
+    ``_thumb`` (inline result previews) variants. Resizing runs in a process pool
+    so the event loop is never blocked; ``collect`` deletes files that no product
+    refers to any more.
+    """
+
+    SIZES = {'display': 1280, 'thumb': 160}
+    _DIGEST_RE = re.compile(r'([0-9a-f]{64})(?:_\w+)?\.jpg$')
+
+    def __init__(self, root: str, workers: int = 2, grace: float = 86400):
+        self.root = root
+        self.workers = workers
+        self.grace = grace
+        self._executor = None
+
+    def paths(self, digest: str) -> dict[str, str]:
+        directory = os.path.join(self.root, digest[:2])
+        paths = {'original': os.path.join(directory, f'{digest}.jpg')}
+        for name in self.SIZES:
+            paths[name] = os.path.join(directory, f'{digest}_{name}.jpg')
+        return paths
+
+    def digest_of(self, path: str) -> str | None:
+        match = self._DIGEST_RE.search(path or '')
+        return match.group(1) if match else None
+
+    def variant(self, image_path: str, name: str) -> str | None:
+        """Path of the ``name`` variant of a stored image, None for images saved before the store."""
+        digest = self.digest_of(image_path)
+        return self.paths(digest)[name] if digest else None
+
+    async def save(self, data: bytes) -> str:
+        """Store the image bytes (once per content) and return the display variant's path."""
+        digest = hashlib.sha256(data).hexdigest()
+        paths = self.paths(digest)
+        if not all(os.path.exists(path) for path in paths.values()):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._pool(), store_variants, data, paths, self.SIZES)
+        return paths['display']
+
+    async def store_file(self, image_path: str) -> str | None:
+        """Store an image already on disk (e.g. saved before the store existed), recreating missing variants.
+
+        Returns the display variant's path, or None when the file is gone.
+        """
+        digest = self.digest_of(image_path)
+        source = self.paths(digest)['original'] if digest else image_path
+        try:
+            data = await asyncio.to_thread(read_file, source)
+        except FileNotFoundError:
+            return None
+        return await self.save(data)
+
+    async def collect(self) -> int:
+        """Delete stored files not referenced by any product, sparing files younger than ``grace``.
+
+        The grace period covers images uploaded by an admin whose product is not
+        saved yet.
+        """
+        async with database.get_session() as session:
+            images = (await session.execute(select(Product.image))).scalars().all()
+        removed = await asyncio.to_thread(self._sweep, images)
+        if removed:
+            logging.info(f"Media: removed {removed} unreferenced files")
+        return removed
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _sweep(self, images) -> int:
+        paths = {os.path.normpath(image) for image in images if image}
+        digests = {self.digest_of(image) for image in images} - {None}
+        deadline = time.time() - self.grace
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if os.path.normpath(path) in paths or self.digest_of(name) in digests:
+                    continue
+                try:
+                    if os.path.getmtime(path) > deadline:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+media_store = MediaStore(conf.bot.MEDIA_DIRECTORY, workers=conf.bot.MEDIA_WORKERS)
@@ -0,0 +1,12 @@
+import asyncio
+import logging
+
+
+async def run_periodically(func, interval: float, *args):
+    """Await ``func(*args)`` every ``interval`` seconds until cancelled, logging failures."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await func(*args)
+        except Exception as e:
+            logging.exception(f"Periodic task {func.__name__} failed: {e}")
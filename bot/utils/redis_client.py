@@ -0,0 +1,29 @@
+from redis.asyncio import Redis
+
+from config import conf
+
+_redis = None
+
+
+def create_redis():
+    """New Redis client for the configured server, or ``None`` when no Redis is configured."""
+    if conf.rd.URL:
+        return Redis.from_url(conf.rd.URL)
+    if conf.rd.HOST:
+        return Redis(host=conf.rd.HOST, port=int(conf.rd.PORT or 6379), db=int(conf.rd.DB or 0))
+    return None
+
+
+def get_redis():
+    """Shared Redis client, or ``None`` when no Redis is configured."""
+    global _redis
+    if _redis is None:
+        _redis = create_redis()
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
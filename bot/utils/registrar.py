@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db import User, database
+
+INSERT_CHUNK = 1000
+
+
+class UserRegistrar:
+    """Write-behind registration of users coming in through /start.
+
+    Known telegram ids are kept in memory, so a returning user costs nothing. A new
+    user is queued and everyone queued within ``delay`` seconds is written with
+    one ``INSERT ... ON CONFLICT (telegram_id) DO NOTHING`` and a single commit,
+    which also makes concurrent starts of the same user harmless.
+    """
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self._seen: set[int] = set()
+        self._pending: dict[int, dict] = {}
+        self._unflushed: dict[int, asyncio.Future] = {}
+        self._batch: asyncio.Future | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    def __contains__(self, telegram_id):
+        return telegram_id in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    async def load(self):
+        query = select(User.telegram_id).execution_options(yield_per=10000)
+        async with database.session() as session:
+            async for telegram_id in await session.stream_scalars(query):
+                self._seen.add(telegram_id)
+
+    def register(self, user) -> bool:
+        """Queue an aiogram ``User`` for insertion; returns True when it was not known before."""
+        if user.id in self._seen:
+            return False
+        self._seen.add(user.id)
+        self._pending[user.id] = self._row(user)
+        if self._flush_task is None:
+            self._batch = asyncio.get_running_loop().create_future()
+            self._flush_task = asyncio.create_task(self._flush_later())
+        self._unflushed[user.id] = self._batch
+        return True
+
+    async def ensure(self, user):
+        """Register the user if needed and wait until the row exists, before writing rows referencing it."""
+        self.register(user)
+        batch = self._unflushed.get(user.id)
+        if batch is not None and not await asyncio.shield(batch):
+            await self._insert([self._row(user)])
+
+    async def close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        rows, batch = self._pending, self._batch
+        self._pending, self._batch, self._flush_task = {}, None, None
+        try:
+            await self._insert(list(rows.values()))
+            written = True
+        except Exception as e:
+            logging.error(f"Failed to register {len(rows)} users: {e}")
+            # Forget them so the next /start of these users tries again.
+            self._seen.difference_update(rows)
+            written = False
+        for telegram_id in rows:
+            self._unflushed.pop(telegram_id, None)
+        batch.set_result(written)
+
+    @staticmethod
+    def _row(user) -> dict:
+        return {
+            'telegram_id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'username': user.username,
+            'type': User.Type.USER,
+        }
+
+    @staticmethod
+    async def _insert(rows):
+        async with database.session() as session:
+            for i in range(0, len(rows), INSERT_CHUNK):
+                query = insert(User).values(rows[i:i + INSERT_CHUNK]) \
+                    .on_conflict_do_nothing(index_elements=['telegram_id'])
+                await session.execute(query)
+            await session.commit()
+
+
+registrar = UserRegistrar()
@@ -0,0 +1,154 @@
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import signal
+import time
+
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from bot.utils.update_queue import UpdateQueue, update_key
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """Answers Telegram with 200 as soon as the update is queued and handles it on an ``UpdateQueue``.
+
+    On shutdown the queued updates are drained (up to ``shutdown_timeout``)
+    before the bot session closes. ``GET {path}/queue`` shows the queue state
+    to requests carrying ``stats_token`` in the ``X-Stats-Token`` header; it is
+    not served at all without a token.
+    """
+
+    def __init__(self, *args, workers: int = 16, max_size: int = 1000, shutdown_timeout: float = 30,
+                 stats_token: str = None, **kwargs):
+        super().__init__(*args, handle_in_background=True, **kwargs)
+        self.shutdown_timeout = shutdown_timeout
+        self.stats_token = stats_token
+        self.queue = UpdateQueue(self._feed, workers=workers, max_size=max_size)
+
+    def register(self, app: web.Application, /, path: str, **kwargs) -> None:
+        super().register(app, path, **kwargs)
+        if self.stats_token:
+            app.router.add_get(f"{path}/queue", self.handle_stats)
+
+    async def _feed(self, item):
+        bot, update = item
+        await self._background_feed_update(bot=bot, update=update)
+
+    async def _handle_request_background(self, bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self.queue.put(update_key(update), (bot, update))
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get('X-Stats-Token', '').encode(), self.stats_token.encode()):
+            return web.Response(status=403)
+        return web.json_response(self.queue.stats())
+
+    async def close(self) -> None:
+        await self.queue.close(self.shutdown_timeout)
+        await super().close()
+
+
+async def serve_app(app: web.Application, host, port, shutdown_timeout: float, reuse_port=False, ready=None,
+                    on_stop=None, stop_grace: float = 0):
+    """Serve ``app`` until SIGTERM/SIGINT, then stop accepting and drain in-flight requests.
+
+    ``on_stop()`` is called as soon as the signal arrives and the worker keeps
+    serving for ``stop_grace`` seconds more, so readiness checks can fail first.
+    """
+    runner = web.AppRunner(app, shutdown_timeout=shutdown_timeout)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, reuse_port=reuse_port)
+    await site.start()
+    if ready is not None:
+        ready.set()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        if on_stop is not None:
+            on_stop()
+        await asyncio.sleep(stop_grace)
+    finally:
+        await runner.cleanup()
+
+
+class Supervisor:
+    """Keeps ``workers`` processes running ``target(ready_event)`` that share one port via SO_REUSEPORT.
+
+    SIGHUP restarts the workers one at a time: a replacement is started and waited
+    for until it listens, then the old worker gets SIGTERM and drains. SIGTERM or
+    SIGINT stops all workers gracefully. Crashed workers are started again.
+    """
+
+    def __init__(self, target, workers: int, shutdown_timeout: float):
+        self.target = target
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._processes = []
+        self._ready_events = {}
+        self._stopping = False
+        self._restart_requested = False
+
+    def _spawn(self, wait=False):
+        ready = self._context.Event()
+        process = self._context.Process(target=self.target, args=(ready,))
+        process.start()
+        # The event has to outlive the child's start-up, it is unpickled there by name.
+        self._ready_events[process.pid] = ready
+        if wait and not ready.wait(timeout=60):
+            logging.warning(f"Worker {process.pid} did not report readiness in time")
+        return process
+
+    def _stop_process(self, process):
+        process.terminate()
+        process.join(self.shutdown_timeout + 5)
+        if process.is_alive():
+            logging.warning(f"Worker {process.pid} did not drain in time, killing it")
+            process.kill()
+            process.join()
+        self._ready_events.pop(process.pid, None)
+
+    def _request_stop(self, *_):
+        self._stopping = True
+
+    def _request_restart(self, *_):
+        self._restart_requested = True
+
+    def rolling_restart(self):
+        logging.info("Rolling restart of %s workers", len(self._processes))
+        for i, old in enumerate(list(self._processes)):
+            self._processes[i] = self._spawn(wait=True)
+            self._stop_process(old)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_restart)
+
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        logging.info("Started workers: %s", [process.pid for process in self._processes])
+        while not self._stopping:
+            time.sleep(0.5)
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart()
+            for i, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stopping:
+                    logging.warning(f"Worker {process.pid} exited with {process.exitcode}, restarting")
+                    self._ready_events.pop(process.pid, None)
+                    time.sleep(1)
+                    self._processes[i] = self._spawn()
+
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(self.shutdown_timeout + 5)
+            if process.is_alive():
+                process.kill()
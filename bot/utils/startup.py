@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from aiohttp import web
+
+from bot.utils.redis_client import get_redis
+
+FINGERPRINT_KEY = 'startup:commands:{bot_id}'
+
+
+class Startup:
+    """Times the start-up steps and tells load balancers when the worker can take traffic.
+
+    ``run`` awaits independent steps concurrently and records how long each one
+    took. The server only listens once start-up is done, so ``GET /ready`` is
+    about the other end: it answers 200 with the timings while serving and 503
+    from ``mark_draining`` on, giving the load balancer time to stop routing
+    here before the worker stops accepting connections. The time from process
+    start to the first handled update is logged once, that is the cold start
+    users actually see.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.timings: dict[str, float] = {}
+        self.ready_after: float | None = None
+        self.first_update_after: float | None = None
+
+    @property
+    def ready(self):
+        return self.ready_after is not None
+
+    async def step(self, name, awaitable):
+        started = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = round(time.monotonic() - started, 3)
+            logging.info(f"Startup: {name} took {self.timings[name]:.3f}s")
+
+    async def run(self, **steps):
+        """Await the ``name=awaitable`` steps concurrently; returns their results by name."""
+        results = await asyncio.gather(*(self.step(name, awaitable) for name, awaitable in steps.items()))
+        return dict(zip(steps, results))
+
+    def mark_ready(self):
+        self.ready_after = round(time.monotonic() - self.started, 3)
+        logging.info(f"Ready in {self.ready_after:.3f}s")
+
+    def mark_draining(self):
+        self.ready_after = None
+
+    def update_handled(self):
+        if self.first_update_after is None:
+            self.first_update_after = round(time.monotonic() - self.started, 3)
+            logging.info(f"First update handled {self.first_update_after:.3f}s after start")
+
+    def stats(self):
+        return {'ready': self.ready, 'ready_after': self.ready_after,
+                'first_update_after': self.first_update_after, 'steps': self.timings}
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats(), status=200 if self.ready else 503)
+
+    def register(self, app: web.Application, path: str = '/ready'):
+        app.router.add_get(path, self.handle_ready)
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON-serialisable ``parts``."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def stored_fingerprint(bot_id) -> str | None:
+    """Fingerprint of the command menu last sent to Telegram; None without Redis, so it is always sent."""
+    redis = get_redis()
+    if redis is None:
+        return None
+    value = await redis.get(FINGERPRINT_KEY.format(bot_id=bot_id))
+    return value.decode() if value else None
+
+
+async def store_fingerprint(bot_id, value: str):
+    redis = get_redis()
+    if redis is not None:
+        await redis.set(FINGERPRINT_KEY.format(bot_id=bot_id), value)
+
+
+startup = Startup()
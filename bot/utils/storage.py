@@ -0,0 +1,76 @@
+from typing import Any, Dict
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+
+from bot.utils.redis_client import create_redis
+from config import conf
+
+
+class HashRedisStorage(RedisStorage):
+    """RedisStorage that keeps FSM data in a hash, one JSON-encoded field per key.
+
+    ``update_data`` writes only the changed fields, refreshes the TTL and reads the
+    merged data back in one pipelined round trip, instead of a GET and a SET that
+    can overwrite a concurrent update from another worker.
+    """
+
+    def _decode(self, raw) -> Dict[str, Any]:
+        return {
+            (field.decode('utf-8') if isinstance(field, bytes) else field): self.json_loads(value)
+            for field, value in raw.items()
+        }
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        redis_key = self.key_builder.build(key, "data")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(redis_key)
+            if data:
+                pipe.hset(redis_key, mapping={field: self.json_dumps(value) for field, value in data.items()})
+                if self.data_ttl:
+                    pipe.expire(redis_key, self.data_ttl)
+            await pipe.execute()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._decode(await self.redis.hgetall(self.key_builder.build(key, "data")))
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        if not data:
+            return await self.get_data(key)
+        redis_key = self.key_builder.build(key, "data")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(redis_key, mapping={field: self.json_dumps(value) for field, value in data.items()})
+            if self.data_ttl:
+                pipe.expire(redis_key, self.data_ttl)
+            pipe.hgetall(redis_key)
+            *_, raw = await pipe.execute()
+        return self._decode(raw)
+
+
+def create_storage() -> BaseStorage:
+    """FSM storage selected by FSM_STORAGE: ``redis``, ``fakeredis`` (tests) or ``memory``.
+
+    Without FSM_STORAGE Redis is used when it is configured, memory otherwise.
+    """
+    backend = conf.rd.FSM_STORAGE or ('redis' if conf.rd.URL or conf.rd.HOST else 'memory')
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'fakeredis':
+        try:
+            from fakeredis.aioredis import FakeRedis
+        except ImportError:
+            raise RuntimeError("FSM_STORAGE=fakeredis requires the fakeredis package")
+        redis = FakeRedis()
+    elif backend == 'redis':
+        redis = create_redis()
+        if redis is None:
+            raise RuntimeError("FSM_STORAGE=redis requires REDIS_URL or REDIS_HOST")
+    else:
+        raise RuntimeError(f"Unknown FSM_STORAGE: {backend}")
+    return HashRedisStorage(
+        redis,
+        key_builder=DefaultKeyBuilder(prefix='bookshop_fsm'),
+        state_ttl=conf.rd.FSM_STATE_TTL,
+        data_ttl=conf.rd.FSM_DATA_TTL,
+    )
@@ -0,0 +1,83 @@
+import asyncio
+
+from aiohttp import web
+from sqlalchemy import select
+
+from bot.utils.cache import TTLCache
+from bot.utils.catalog import catalog
+from bot.utils.media import media_store, read_file
+from config import conf
+from db import Product, database
+
+MISSING = object()
+
+
+class ThumbnailServer:
+    """``GET /thumbs/{product_id}.jpg``: the small previews shown next to inline results.
+
+    Thumbnail bytes are kept in memory, so serving one is a dict lookup. The ETag
+    is the image's content hash and the URL carries it as ``?v=``, so versioned
+    URLs are cacheable forever and Telegram fetches each thumbnail once. The
+    memory cache is keyed by that version too, so a new image is read on its
+    first request; unversioned URLs and missing thumbnails are only kept briefly.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: int = 86400, short_ttl: int = 60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.short_ttl = short_ttl
+
+    def url(self, product) -> str | None:
+        if not product.image:
+            return None
+        digest = media_store.digest_of(product.image)
+        version = f"?v={digest[:16]}" if digest else ''
+        return f"{conf.bot.BASE_WEBHOOK_URL}/thumbs/{product.id}.jpg{version}"
+
+    async def load(self, product_id):
+        """``(etag, bytes)`` of the product's thumbnail, creating the variants of older images first."""
+        async with database.get_session() as session:
+            image = (await session.execute(select(Product.image).where(Product.id == product_id))).scalar()
+        if image is None:
+            return None
+        thumb = media_store.variant(image, 'thumb')
+        try:
+            data = await asyncio.to_thread(read_file, thumb) if thumb else None
+        except FileNotFoundError:
+            data = None
+        if data is None:
+            display = await media_store.store_file(image)
+            if display is None:
+                return None
+            if display != image:
+                # Moved into the content-addressed store: point the product at it.
+                await Product.update(id_=product_id, image=display)
+                await catalog.invalidate(products=[product_id])
+            thumb = media_store.variant(display, 'thumb')
+            data = await asyncio.to_thread(read_file, thumb)
+        return f'"{media_store.digest_of(thumb)}"', data
+
+    async def handle(self, request: web.Request) -> web.Response:
+        product_id = int(request.match_info['product_id'])
+        version = request.query.get('v')
+        key = (product_id, version)
+        entry = self._cache.get(key, MISSING)
+        if entry is MISSING:
+            entry = await self.load(product_id)
+            self._cache.set(key, entry, ttl=None if entry and version else self.short_ttl)
+        if entry is None:
+            raise web.HTTPNotFound()
+        etag, data = entry
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'public, max-age=31536000, immutable' if version
+            else f'public, max-age={self.short_ttl}',
+        }
+        if etag in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=data, content_type='image/jpeg', headers=headers)
+
+    def register(self, app: web.Application):
+        app.router.add_get(r'/thumbs/{product_id:\d+}.jpg', self.handle)
+
+
+thumbnails = ThumbnailServer(conf.bot.THUMBS_CACHE_SIZE)
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from collections import deque
+
+
+def update_key(update: dict):
+    """The user an update belongs to, read from the raw payload so nothing is parsed twice.
+
+    Updates without a sender (polls, channel posts) fall back to the chat or to
+    their own ``update_id`` and are therefore not ordered against anything.
+    """
+    for event_type, event in update.items():
+        if event_type == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+        chat = event.get('chat')
+        if chat:
+            return chat['id']
+    return ('update', update.get('update_id'))
+
+
+class UpdateQueue:
+    """Bounded in-process queue of updates worked off by a fixed number of tasks.
+
+    Updates of one user are handled strictly one after another in arrival order,
+    different users in parallel. A user with queued work is put back at the end
+    of the ready queue after each update, so one busy chat cannot hold a worker.
+    When ``max_size`` updates are waiting ``put`` blocks, which slows down the
+    webhook response and lets Telegram hold back further deliveries.
+    """
+
+    def __init__(self, handler, workers: int = 16, max_size: int = 1000):
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self._pending: dict[object, deque] = {}
+        self._ready: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._idle: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._busy = 0
+        self.depth = 0
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'users': len(self._pending),
+            'busy': self._busy,
+            'workers': len(self._tasks),
+            'max_size': self.max_size,
+        }
+
+    def start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def put(self, key, item):
+        self.start()
+        await self._slots.acquire()
+        self.depth += 1
+        self._idle.clear()
+        items = self._pending.get(key)
+        if items is None:
+            self._pending[key] = deque([item])
+            self._ready.put_nowait(key)
+        else:
+            items.append(item)
+
+    async def join(self, timeout: float = None) -> bool:
+        """Wait until every queued update is handled, True when that happened in time."""
+        if self._idle is None:
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self, timeout: float = None):
+        if not await self.join(timeout):
+            logging.warning("Update queue closed with %s unhandled updates", self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            items = self._pending[key]
+            item = items.popleft()
+            self._busy += 1
+            try:
+                await self.handler(item)
+            except Exception:
+                logging.exception("Failed to handle update for %s", key)
+            finally:
+                self._busy -= 1
+                self.depth -= 1
+                self._slots.release()
+                if items:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                if not self.depth:
+                    self._idle.set()
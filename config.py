@@ -21,6 +21,14 @@ class DatabaseConfig(BaseConfig):
     HOST: str = os.getenv('DB_HOST')
     PORT: str = os.getenv('DB_PORT')
 
+    POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 10))
+    MAX_OVERFLOW: int = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    POOL_TIMEOUT: int = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    POOL_RECYCLE: int = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    POOL_PRE_PING: bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    STATEMENT_CACHE_SIZE: int = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+    POOL_WARM: int = int(os.getenv('DB_POOL_WARM', 4))
+
     @property
     def db_url(self):
         return f"postgresql+asyncpg://{self.USER}:{self.PASS}@{self.HOST}:{self.PORT}/{self.NAME}"
@@ -36,8 +44,30 @@ class BotConfig(BaseConfig):
     WEB_SERVER_HOST: str = os.getenv('WEB_SERVER_HOST')
     WEB_SERVER_PORT: int = int(os.getenv('WEB_SERVER_PORT', 8080))
     WEBHOOK_PATH = "/webhook"
+    WORKERS: int = int(os.getenv('WORKERS', 1))
+    SHUTDOWN_TIMEOUT: int = int(os.getenv('SHUTDOWN_TIMEOUT', 30))
+    READY_GRACE: int = int(os.getenv('READY_GRACE', 3))
+    UPDATE_WORKERS: int = int(os.getenv('UPDATE_WORKERS', 16))
+    UPDATE_QUEUE_SIZE: int = int(os.getenv('UPDATE_QUEUE_SIZE', 1000))
+    STATS_TOKEN: str = os.getenv('STATS_TOKEN')
     WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
-    BASE_WEBHOOK_URL = os.getenv('BASE_WEBHOOK_URL')
+    BASE_WEBHOOK_URL: str = os.getenv('BASE_WEBHOOK_URL') or "https://jasur.fil.uz"
+
+    INLINE_PAGE_SIZE: int = int(os.getenv('INLINE_PAGE_SIZE', 50))
+    INLINE_PAGE_TTL: int = int(os.getenv('INLINE_PAGE_TTL', 60))
+    INLINE_CACHE_TIME: int = int(os.getenv('INLINE_CACHE_TIME', 60))
+    CATALOG_PAGE_SIZE: int = int(os.getenv('CATALOG_PAGE_SIZE', 20))
+    CATALOG_CACHE_SIZE: int = int(os.getenv('CATALOG_CACHE_SIZE', 4096))
+
+    STOCK_RESERVATION_TTL: int = int(os.getenv('STOCK_RESERVATION_TTL', 0))
+
+    MEDIA_DIRECTORY: str = os.getenv('MEDIA_DIRECTORY', './media')
+    MEDIA_WORKERS: int = int(os.getenv('MEDIA_WORKERS', 2))
+    MEDIA_GC_INTERVAL: int = int(os.getenv('MEDIA_GC_INTERVAL', 3600))
+    THUMBS_CACHE_SIZE: int = int(os.getenv('THUMBS_CACHE_SIZE', 4096))
+
+    BROADCAST_RATE: int = int(os.getenv('BROADCAST_RATE', 25))
+    ADMIN_REFRESH_INTERVAL: int = int(os.getenv('ADMIN_REFRESH_INTERVAL', 60))
 
     # MAIN_BOT_PATH: str = "/webhook/main"
     # OTHER_BOTS_PATH: str = "/webhook/bot/{bot_token}"
@@ -46,7 +76,7 @@ class BotConfig(BaseConfig):
 
     @property
     def get_admin_list(self):
-        return list(map(int, self.ADMIN_LIST.split(',')))
+        return [int(admin) for admin in self.ADMIN_LIST.split(',') if admin.strip()]
 
 
 @dataclass
@@ -57,6 +87,10 @@ class RedisConfig(BaseConfig):
     HOST: str = os.getenv('REDIS_HOST')
     PORT: str = os.getenv('REDIS_PORT')
 
+    FSM_STORAGE: str = os.getenv('FSM_STORAGE')
+    FSM_STATE_TTL: int = int(os.getenv('FSM_STATE_TTL', 86400))
+    FSM_DATA_TTL: int = int(os.getenv('FSM_DATA_TTL', 86400 * 30))
+
 
 @dataclass
 class WebConfig(BaseConfig):
@@ -1,2 +1,2 @@
-from db.models import User, Category, Product, Order, Basket
+from db.models import User, Category, Product, Order, Basket, Broadcast
 from db.base import db as database, TimeBaseModel,BaseModel
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, delete, distinct
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.base import db, TimeStamp
+from db.models import Order, OrderItem, Product, Category, DailySale, ProductSale, CategorySale
+
+SOLD = (Order.Status.DELIVERING, Order.Status.DELIVERED)
+
+
+def _order_day():
+    return func.date(func.timezone(TimeStamp.TASHKENT_TIMEZONE.zone, Order.created_at))
+
+
+def _daily(condition):
+    items = select(func.sum(OrderItem.quantity)).where(OrderItem.order_id == Order.id) \
+        .correlate(Order).scalar_subquery()
+    orders = select(_order_day().label('day'), Order.total_amount.label('revenue'), items.label('items')) \
+        .where(condition).subquery()
+    return select(orders.c.day, func.count(), func.coalesce(func.sum(orders.c['items']), 0),
+                  func.sum(orders.c.revenue)).group_by(orders.c.day)
+
+
+def _sold_price():
+    # Lines written before order_items.price existed, by a worker still on the old code, have no price.
+    return func.coalesce(OrderItem.price, Product.price)
+
+
+def _product_lines(condition):
+    return (
+        select(OrderItem.product_id, Product.title, Product.category_id,
+               func.count(distinct(OrderItem.order_id)).label('orders'),
+               func.sum(OrderItem.quantity).label('items'),
+               func.sum(OrderItem.quantity * _sold_price()).label('revenue'))
+        .join(Product, Product.id == OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(condition)
+        .group_by(OrderItem.product_id, Product.title, Product.category_id)
+    )
+
+
+def _categories(lines):
+    return (
+        select(Category.id, Category.name, func.sum(lines.c['items']), func.sum(lines.c.revenue))
+        .join(lines, lines.c.category_id == Category.id)
+        .group_by(Category.id, Category.name)
+    )
+
+
+def _upsert(model, key, columns, rows, added, replaced=()):
+    query = insert(model).from_select(columns, rows)
+    set_ = {column: getattr(model, column) + query.excluded[column] for column in added}
+    set_.update({column: query.excluded[column] for column in replaced})
+    return query.on_conflict_do_update(index_elements=[key], set_=set_)
+
+
+def _statements(condition):
+    lines = _product_lines(condition).subquery()
+    return (
+        _upsert(DailySale, 'day', ['day', 'orders', 'items', 'revenue'], _daily(condition),
+                added=('orders', 'items', 'revenue')),
+        _upsert(ProductSale, 'product_id', ['product_id', 'title', 'orders', 'items', 'revenue'],
+                select(lines.c.product_id, lines.c.title, lines.c.orders, lines.c['items'], lines.c.revenue),
+                added=('orders', 'items', 'revenue'), replaced=('title',)),
+        _upsert(CategorySale, 'category_id', ['category_id', 'name', 'items', 'revenue'], _categories(lines),
+                added=('items', 'revenue'), replaced=('name',)),
+    )
+
+
+async def record_sale(session: AsyncSession, order_id):
+    """Add one accepted order to the aggregates; runs in the transaction that accepts it."""
+    for statement in _statements(Order.id == order_id):
+        await session.execute(statement)
+
+
+async def rebuild_sales(session: AsyncSession = None):
+    """Recompute the aggregates from the whole order history, for backfilling or repair."""
+    async with db.get_session(session) as session:
+        try:
+            for model in (DailySale, ProductSale, CategorySale):
+                await session.execute(delete(model))
+            for statement in _statements(Order.order_status.in_(SOLD)):
+                await session.execute(statement)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def sales_summary(top: int = 10, session: AsyncSession = None) -> dict:
+    """Totals for today, the last 7 and 30 days and all time, plus the best products and categories.
+
+    Reads only the aggregate tables, so the cost does not grow with the number of orders.
+    """
+    today = datetime.now(TimeStamp.TASHKENT_TIMEZONE).date()
+
+    def since(day=None):
+        sums = [func.sum(column) for column in (DailySale.orders, DailySale.items, DailySale.revenue)]
+        if day is not None:
+            sums = [total.filter(DailySale.day >= day) for total in sums]
+        return [func.coalesce(total, 0) for total in sums]
+
+    totals = select(*since(today), *since(today - timedelta(days=6)), *since(today - timedelta(days=29)), *since())
+    async with db.get_session(session) as session:
+        row = (await session.execute(totals)).one()
+        products = (await session.execute(
+            select(ProductSale.title, ProductSale.items, ProductSale.revenue)
+            .order_by(ProductSale.revenue.desc()).limit(top)
+        )).all()
+        categories = (await session.execute(
+            select(CategorySale.name, CategorySale.items, CategorySale.revenue)
+            .order_by(CategorySale.revenue.desc()).limit(top)
+        )).all()
+    summary = {name: row[i * 3:i * 3 + 3] for i, name in enumerate(('today', 'week', 'month', 'total'))}
+    summary['products'] = products
+    summary['categories'] = categories
+    return summary
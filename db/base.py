@@ -1,10 +1,13 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 
 import pytz
 import sqlalchemy
 from sqlalchemy import delete as sqlalchemy_delete, update as sqlalchemy_update, select, func, BigInteger, and_
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, declared_attr, sessionmaker, Mapped, mapped_column, selectinload
+from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, declared_attr, Mapped, mapped_column, selectinload
 from sqlalchemy.types import TypeDecorator, DateTime
 
 from config import conf
@@ -27,18 +30,61 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 
 class AsyncDatabaseSession:
+    """Engine with a connection pool and a factory of per-update sessions.
+
+    Handlers get their own ``AsyncSession`` from ``DatabaseSessionMiddleware``; the
+    session is also bound to the current context so ``AbstractClass`` helpers pick
+    it up when no session is passed explicitly.
+    """
+
     def __init__(self):
-        self._session = None
         self._engine = None
+        self._session_maker = None
+        self._current_session = ContextVar('current_session', default=None)
 
-    def __getattr__(self, name):
-        return getattr(self._session, name)
+    @property
+    def engine(self):
+        return self._engine
 
     def init(self):
         self._engine = create_async_engine(
-            conf.db.db_url
+            conf.db.db_url,
+            pool_size=conf.db.POOL_SIZE,
+            max_overflow=conf.db.MAX_OVERFLOW,
+            pool_timeout=conf.db.POOL_TIMEOUT,
+            pool_recycle=conf.db.POOL_RECYCLE,
+            pool_pre_ping=conf.db.POOL_PRE_PING,
+            connect_args={'prepared_statement_cache_size': conf.db.STATEMENT_CACHE_SIZE},
         )
-        self._session = sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)()
+        self._session_maker = async_sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
+
+    def session(self) -> AsyncSession:
+        return self._session_maker()
+
+    @contextmanager
+    def bind(self, session: AsyncSession):
+        token = self._current_session.set(session)
+        try:
+            yield session
+        finally:
+            self._current_session.reset(token)
+
+    @asynccontextmanager
+    async def get_session(self, session: AsyncSession = None):
+        session = session or self._current_session.get()
+        if session is not None:
+            yield session
+            return
+        async with self.session() as session:
+            yield session
+
+    async def warm(self, connections: int):
+        """Open ``connections`` pooled connections up front, so the first updates do not pay for the handshakes."""
+        async def ping():
+            async with self._engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+
+        await asyncio.gather(*(ping() for _ in range(min(connections, conf.db.POOL_SIZE))))
 
     async def create_all(self):
         async with self._engine.begin() as conn:
@@ -48,6 +94,9 @@ class AsyncDatabaseSession:
         async with self._engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
 
+    async def dispose(self):
+        await self._engine.dispose()
+
 
 db = AsyncDatabaseSession()
 db.init()
@@ -55,22 +104,23 @@ db.init()
 
 class AbstractClass:
     @staticmethod
-    async def commit():
+    async def commit(session: AsyncSession):
         try:
-            await db.commit()
+            await session.commit()
         except Exception:
-            await db.rollback()
+            await session.rollback()
             raise
 
     @classmethod
-    async def create(cls, **kwargs):
-        object_ = cls(**kwargs)
-        db.add(object_)
-        await cls.commit()
-        return object_
+    async def create(cls, session: AsyncSession = None, **kwargs):
+        async with db.get_session(session) as session:
+            object_ = cls(**kwargs)
+            session.add(object_)
+            await cls.commit(session)
+            return object_
 
     @classmethod
-    async def update(cls, id_=None, telegram_id=None, **kwargs):
+    async def update(cls, id_=None, telegram_id=None, session: AsyncSession = None, **kwargs):
         if id_:
             query = (
                 sqlalchemy_update(cls)
@@ -85,79 +135,108 @@ class AbstractClass:
                 .values(**kwargs)
                 .execution_options(synchronize_session="fetch")
             )
-        await db.execute(query)
-        await cls.commit()
+        async with db.get_session(session) as session:
+            await session.execute(query)
+            await cls.commit(session)
 
     @classmethod
-    async def get(cls, id_=None, user_telegram_id=None):
-        if id_:
-            query = select(cls).where(cls.id == id_)
-            return (await db.execute(query)).scalar()
-        else:
-            query = select(cls).where(cls.user_telegram_id == user_telegram_id)
-            return (await db.execute(query)).scalars()
+    async def get(cls, id_=None, user_telegram_id=None, session: AsyncSession = None):
+        async with db.get_session(session) as session:
+            if id_:
+                query = select(cls).where(cls.id == id_)
+                return (await session.execute(query)).scalar()
+            else:
+                query = select(cls).where(cls.user_telegram_id == user_telegram_id)
+                return (await session.execute(query)).scalars().all()
 
     @classmethod
-    async def get_products_by_user(cls, user_id, order_id=None):
-        async with db._session as session:
-            if user_id and order_id:
-                query = (
-                    sqlalchemy.select(cls)
-                    .options(selectinload(cls.product))
-                    .where(cls.user_telegram_id == user_id, cls.order_id == order_id)
-                )
-            else:
-                query = (
-                    sqlalchemy.select(cls)
-                    .options(selectinload(cls.product))
-                    .where(cls.user_telegram_id == user_id)
-                )
+    async def get_products_by_user(cls, user_id, order_id=None, session: AsyncSession = None):
+        if user_id and order_id:
+            query = (
+                sqlalchemy.select(cls)
+                .options(selectinload(cls.product))
+                .where(cls.user_telegram_id == user_id, cls.order_id == order_id)
+            )
+        else:
+            query = (
+                sqlalchemy.select(cls)
+                .options(selectinload(cls.product))
+                .where(cls.user_telegram_id == user_id)
+            )
+        async with db.get_session(session) as session:
             result = await session.execute(query)
             return result.scalars().all()
 
     @classmethod
-    async def get_with_telegram_id(cls, telegram_id):
+    async def get_with_telegram_id(cls, telegram_id, session: AsyncSession = None):
         query = select(cls).where(cls.telegram_id == telegram_id)
-        return (await db.execute(query)).scalar()
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).scalar()
 
     @classmethod
-    async def delete(cls, id_=None, user_telegram_id=None):
+    async def delete(cls, id_=None, user_telegram_id=None, session: AsyncSession = None):
         if id_:
             query = sqlalchemy_delete(cls).where(cls.id == id_)
         else:
             query = sqlalchemy_delete(cls).where(cls.user_telegram_id == user_telegram_id)
-        await db.execute(query)
-        await cls.commit()
+        async with db.get_session(session) as session:
+            await session.execute(query)
+            await cls.commit(session)
 
     @classmethod
-    async def count_grouped_by_user_telegram_id(cls, user_telegram_id):
+    async def count_grouped_by_user_telegram_id(cls, user_telegram_id, session: AsyncSession = None):
         query = (
             sqlalchemy.select(sqlalchemy.func.count(sqlalchemy.distinct(cls.product_id)))
             .where(cls.user_telegram_id == user_telegram_id)
             .group_by(cls.user_telegram_id)
         )
-        async with db._session as session:
+        async with db.get_session(session) as session:
             result = await session.execute(query)
             count = result.scalar_one_or_none()
         return count if count else 0
 
     @classmethod
-    async def get_all(cls):
-        return (await db.execute(select(cls))).scalars()
+    async def get_all(cls, session: AsyncSession = None):
+        async with db.get_session(session) as session:
+            return (await session.execute(select(cls))).scalars().all()
 
     @classmethod
-    async def is_admin(cls, telegram_id):
+    async def keyset_page(cls, *columns, where=None, cursor=0, back=False, limit=20, session: AsyncSession = None):
+        """One page of ``columns`` in id order, keyset-paginated on ``id``.
+
+        ``cursor`` is the last id of the previous page, or the first id of the next
+        page when going ``back``. Returns ``(rows, has_prev, has_next)``.
+        """
+        query = select(cls.id, *columns)
+        if where is not None:
+            query = query.where(where)
+        if back:
+            query = query.where(cls.id < cursor).order_by(cls.id.desc())
+        else:
+            query = query.where(cls.id > (cursor or 0)).order_by(cls.id)
+        async with db.get_session(session) as session:
+            rows = (await session.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if back:
+            return rows[::-1], has_more, True
+        return rows, bool(cursor), has_more
+
+    @classmethod
+    async def is_admin(cls, telegram_id, session: AsyncSession = None):
         query = select(cls).where(
             and_(cls.telegram_id == telegram_id, cls.type == "ADMIN")
         )
 
-        return (await db.execute(query)).scalars().first()
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).scalars().first()
 
     @classmethod
-    async def get_name(cls, id_: int):
+    async def get_name(cls, id_: int, session: AsyncSession = None):
         query = select(cls).where(cls.id == id_)
-        result = await db.execute(query)
-        instance = result.scalars().first()
+        async with db.get_session(session) as session:
+            result = await session.execute(query)
+            instance = result.scalars().first()
 
         if instance:
             return instance.name
@@ -0,0 +1,150 @@
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.analytics import record_sale
+from db.base import db
+from db.models import Product, Order, OrderItem
+
+
+class OutOfStockError(Exception):
+    """Raised when the stock cannot cover every line of an order."""
+
+    def __init__(self, order_id):
+        super().__init__(f"Not enough stock for order {order_id}")
+        self.order_id = order_id
+
+
+def _order_lines(order_id):
+    return (
+        select(OrderItem.product_id, func.sum(OrderItem.quantity).label('qty'))
+        .where(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+        .cte('lines')
+    )
+
+
+async def _apply_to_order(session: AsyncSession, order_id, values, condition=None):
+    """Update the stock of every product of the order in one statement, all lines or none.
+
+    Each product row is changed with a conditional ``UPDATE ... FROM lines``; when
+    fewer rows match than the order has lines the caller's transaction must not be
+    committed, so ``OutOfStockError`` is raised.
+    """
+    lines = _order_lines(order_id)
+    query = update(Product).where(Product.id == lines.c.product_id)
+    if condition is not None:
+        query = query.where(condition(lines))
+    updated = query.values(values(lines)).returning(Product.id).cte('updated')
+    expected, done = (await session.execute(select(
+        select(func.count()).select_from(lines).scalar_subquery(),
+        select(func.count()).select_from(updated).scalar_subquery(),
+    ))).one()
+    if done != expected:
+        raise OutOfStockError(order_id)
+
+
+async def reserve_stock(session: AsyncSession, order_id):
+    """Hold the order's quantities in ``products.reserved`` without taking them from stock."""
+    await _apply_to_order(
+        session, order_id,
+        values=lambda lines: {'reserved': Product.reserved + lines.c.qty},
+        condition=lambda lines: Product.quantity - Product.reserved >= lines.c.qty,
+    )
+
+
+async def release_stock(session: AsyncSession, order_id):
+    await _apply_to_order(
+        session, order_id,
+        values=lambda lines: {'reserved': func.greatest(Product.reserved - lines.c.qty, 0)},
+    )
+
+
+async def take_stock(session: AsyncSession, order_id, reserved=False):
+    """Decrement the stock for the order; a reservation is converted, otherwise free stock is checked."""
+    if reserved:
+        await _apply_to_order(
+            session, order_id,
+            values=lambda lines: {'quantity': Product.quantity - lines.c.qty,
+                                  'reserved': func.greatest(Product.reserved - lines.c.qty, 0)},
+            condition=lambda lines: Product.quantity >= lines.c.qty,
+        )
+    else:
+        await _apply_to_order(
+            session, order_id,
+            values=lambda lines: {'quantity': Product.quantity - lines.c.qty},
+            condition=lambda lines: Product.quantity - Product.reserved >= lines.c.qty,
+        )
+
+
+async def accept_order(order_id, session: AsyncSession = None) -> bool:
+    """Move a pending order to delivering, take its stock and count the sale in one transaction.
+
+    Returns False when the order was already accepted or cancelled, so a repeated
+    tap never decrements twice.
+    """
+    query = (
+        update(Order)
+        .where(Order.id == order_id, Order.order_status == Order.Status.PENDING)
+        .values(order_status=Order.Status.DELIVERING)
+        .returning(Order.reserved_until)
+    )
+    async with db.get_session(session) as session:
+        try:
+            order = (await session.execute(query)).first()
+            if order is None:
+                await session.rollback()
+                return False
+            await take_stock(session, order_id, reserved=order.reserved_until is not None)
+            await record_sale(session, order_id)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+    return True
+
+
+async def cancel_order(order_id, session: AsyncSession = None) -> bool:
+    query = (
+        update(Order)
+        .where(Order.id == order_id, Order.order_status == Order.Status.PENDING)
+        .values(order_status=Order.Status.CANCELLED)
+        .returning(Order.reserved_until)
+    )
+    async with db.get_session(session) as session:
+        try:
+            order = (await session.execute(query)).first()
+            if order is None:
+                await session.rollback()
+                return False
+            if order.reserved_until is not None:
+                await release_stock(session, order_id)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+    return True
+
+
+async def release_expired_reservations(session: AsyncSession = None):
+    """Give back the stock held by pending orders whose reservation has expired, in one statement."""
+    expired = (
+        update(Order)
+        .where(Order.reserved_until < func.now(), Order.order_status == Order.Status.PENDING)
+        .values(reserved_until=None)
+        .returning(Order.id)
+        .cte('expired')
+    )
+    lines = (
+        select(OrderItem.product_id, func.sum(OrderItem.quantity).label('qty'))
+        .where(OrderItem.order_id.in_(select(expired.c.id)))
+        .group_by(OrderItem.product_id)
+        .cte('lines')
+    )
+    query = (
+        update(Product)
+        .where(Product.id == lines.c.product_id)
+        .values(reserved=func.greatest(Product.reserved - lines.c.qty, 0))
+    )
+    async with db.get_session(session) as session:
+        await session.execute(query)
+        await session.commit()
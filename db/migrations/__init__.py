@@ -0,0 +1,147 @@
+"""Versioned schema migrations, applied once per deploy with ``make migrate``.
+
+Each module in ``db/migrations/versions`` is named ``NNNN_description.py`` and
+defines ``async def upgrade(conn)``. Applied versions are recorded in
+``schema_migrations``. By default a migration runs in one transaction together
+with its bookkeeping row. A module that sets ``transactional = False`` runs in
+autocommit mode, which ``CREATE INDEX CONCURRENTLY`` needs, and must therefore
+be safe to run again after a failure half-way.
+
+Revisions are frozen: they spell out their DDL instead of deriving it from
+the models, so a database gets the same schema whatever the code looks like
+when it is migrated. ``0001`` is the schema of the first release. When a
+model changes, add a revision that brings existing databases along. Guard
+its statements (``IF NOT EXISTS`` and the like), because databases of the
+first release were created by ``create_all`` and a revision may find its
+work partly done.
+"""
+import importlib
+import logging
+import pkgutil
+import time
+
+from sqlalchemy import text
+
+from db.base import db
+
+# Any constant works, as long as nothing else in the database takes the same advisory lock.
+LOCK_ID = 7_120_240_001
+LOCK_TIMEOUT = '5s'
+
+
+class PendingMigrationsError(RuntimeError):
+    def __init__(self, pending):
+        super().__init__(f"Database schema is behind, run `make migrate` "
+                         f"(pending: {', '.join(name for _, name, _ in pending)})")
+        self.pending = pending
+
+
+def discover():
+    """``(version, name, module)`` for every migration module, in version order."""
+    from db.migrations import versions
+
+    migrations = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        version, _, name = info.name.partition('_')
+        if not version.isdigit():
+            continue
+        module = importlib.import_module(f'{versions.__name__}.{info.name}')
+        migrations.append((int(version), info.name, module))
+    migrations.sort(key=lambda migration: migration[0])
+    versions_ = [version for version, _, _ in migrations]
+    if len(set(versions_)) != len(versions_):
+        raise RuntimeError(f"Duplicate migration versions: {versions_}")
+    return migrations
+
+
+async def _ensure_table(conn):
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+
+
+async def applied_versions(conn) -> set[int]:
+    exists = (await conn.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL"))).scalar()
+    if not exists:
+        return set()
+    return set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+
+
+async def pending():
+    async with db.engine.connect() as conn:
+        applied = await applied_versions(conn)
+    return [migration for migration in discover() if migration[0] not in applied]
+
+
+async def ensure_current():
+    """Raise ``PendingMigrationsError`` unless every migration has been applied; one query at boot."""
+    missing = await pending()
+    if missing:
+        raise PendingMigrationsError(missing)
+
+
+async def _record(conn, version, name):
+    await conn.execute(text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name) "
+                            "ON CONFLICT (version) DO NOTHING"), {'version': version, 'name': name})
+
+
+async def _apply(version, name, module):
+    if getattr(module, 'transactional', True):
+        async with db.engine.begin() as conn:
+            # Fail fast instead of queueing every query on the table behind our ALTER.
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            await module.upgrade(conn)
+            await _record(conn, version, name)
+        return
+    async with db.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text("SET statement_timeout = 0"))
+        await module.upgrade(conn)
+        await _record(conn, version, name)
+
+
+async def upgrade(target: int = None) -> list[str]:
+    """Apply the pending migrations up to ``target`` (all by default); returns the names applied.
+
+    A session-level advisory lock makes concurrent deploys wait for each other
+    instead of running the same migration twice.
+    """
+    done = []
+    async with db.engine.connect() as lock:
+        lock = await lock.execution_options(isolation_level='AUTOCOMMIT')
+        await lock.execute(text("SELECT pg_advisory_lock(:id)"), {'id': LOCK_ID})
+        try:
+            await _ensure_table(lock)
+            applied = await applied_versions(lock)
+            for version, name, module in discover():
+                if version in applied or (target is not None and version > target):
+                    continue
+                logging.info(f"Applying migration {name}...")
+                started = time.monotonic()
+                await _apply(version, name, module)
+                logging.info(f"Applied {name} in {time.monotonic() - started:.1f}s")
+                done.append(name)
+        finally:
+            await lock.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': LOCK_ID})
+    return done
+
+
+async def create_index_concurrently(conn, name, table, columns, unique=False, where=None):
+    """``CREATE INDEX CONCURRENTLY`` that can be re-run after an interrupted build.
+
+    An interrupted concurrent build leaves an INVALID index behind, which
+    ``IF NOT EXISTS`` would keep forever; it is dropped and built again.
+    """
+    invalid = (await conn.execute(text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name"
+    ), {'name': name})).scalar()
+    if invalid:
+        logging.warning(f"Index {name} is invalid, rebuilding it")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    await conn.execute(text(sql))
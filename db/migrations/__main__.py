@@ -0,0 +1,37 @@
+"""``python -m db.migrations [upgrade [VERSION] | status | check]``"""
+import asyncio
+import logging
+import sys
+
+from db.base import db
+from db.migrations import upgrade, pending, discover
+from db.migrations.plans import check_plans
+
+
+async def main(args) -> int:
+    command = args[0] if args else 'upgrade'
+    try:
+        if command == 'upgrade':
+            done = await upgrade(int(args[1]) if len(args) > 1 else None)
+            print(f"Applied: {', '.join(done)}" if done else "Up to date")
+        elif command == 'status':
+            missing = {version for version, _, _ in await pending()}
+            for version, name, _ in discover():
+                print(f"{'pending' if version in missing else 'applied'}  {name}")
+        elif command == 'check':
+            failures = await check_plans()
+            for failure in failures:
+                print(f"FAIL {failure}")
+            print(f"{len(failures)} hot queries without an index" if failures else "All hot queries use an index")
+            return 1 if failures else 0
+        else:
+            print(__doc__)
+            return 2
+    finally:
+        await db.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,67 @@
+"""Query-plan check for the hot queries: each one must be able to use an index.
+
+Sequential scans are disabled for the check, because on a small or freshly
+migrated table the planner rightly prefers them anyway; a ``Seq Scan`` that is
+still chosen means no index can serve the query at all.
+"""
+import json
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql
+
+from db.base import db
+from db.models import Basket, Order, OrderItem, Product
+
+USER_ID = 1
+ORDER_ID = 1
+CATEGORY_ID = 1
+
+
+def hot_queries():
+    """``(description, table that must not be scanned, statement)``."""
+    return (
+        ("basket of a user", 'baskets',
+         select(Basket).where(Basket.user_telegram_id == USER_ID)),
+        ("basket line of a user and product", 'baskets',
+         select(Basket.id).where(Basket.user_telegram_id == USER_ID, Basket.product_id == 1)),
+        ("items of an order", 'order_items',
+         select(OrderItem).where(OrderItem.order_id == ORDER_ID)),
+        ("items of a user's order", 'order_items',
+         select(OrderItem).where(OrderItem.user_telegram_id == USER_ID, OrderItem.order_id == ORDER_ID)),
+        ("order items of a user", 'order_items',
+         select(OrderItem).where(OrderItem.user_telegram_id == USER_ID)),
+        ("page of a user's orders", 'orders',
+         select(Order).where(Order.user_telegram_id == USER_ID)
+         .order_by(Order.created_at.desc(), Order.id.desc()).limit(6)),
+        ("expired reservations", 'orders',
+         select(Order.id).where(Order.reserved_until < func.now(), Order.order_status == Order.Status.PENDING)),
+        ("products of a category", 'products',
+         select(Product).where(Product.category_id == CATEGORY_ID)),
+        ("page of a category's products", 'products',
+         select(Product.id, Product.title).where(Product.category_id == CATEGORY_ID, Product.id > 0)
+         .order_by(Product.id).limit(21)),
+    )
+
+
+def _seq_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', ()):
+        yield from _seq_scans(child)
+
+
+async def check_plans() -> list[str]:
+    """Returns one line per hot query that falls back to a sequential scan; empty when all is well."""
+    failures = []
+    async with db.engine.connect() as conn:
+        async with conn.begin() as transaction:
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for description, table, statement in hot_queries():
+                sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+                plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                if table in set(_seq_scans(plan[0]['Plan'])):
+                    failures.append(f"{description}: sequential scan on {table}\n    {sql}")
+            await transaction.rollback()
+    return failures
@@ -0,0 +1,108 @@
+"""Baseline: the schema as the first release created it with ``create_all``, written out so it never changes.
+
+Databases running that release already have all of it, so every statement
+is guarded and the revision only builds what is missing. Everything since
+comes from the later revisions.
+"""
+from sqlalchemy import text
+
+STATEMENTS = (
+    """
+    DO $$ BEGIN
+        CREATE TYPE type AS ENUM ('USER', 'ADMIN', 'SUPER_ADMIN');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    DO $$ BEGIN
+        CREATE TYPE status AS ENUM ('DELIVERING', 'DELIVERED', 'PENDING', 'RETURNED', 'CANCELLED');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        name VARCHAR(255) NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        first_name VARCHAR(255) NOT NULL,
+        last_name VARCHAR(255),
+        username VARCHAR(255),
+        telegram_id BIGINT NOT NULL,
+        phone_number VARCHAR(255),
+        type type NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (telegram_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        user_telegram_id BIGINT NOT NULL,
+        phone_number VARCHAR(20) NOT NULL,
+        order_status status NOT NULL,
+        total_amount FLOAT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_telegram_id) REFERENCES users (telegram_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        title VARCHAR(255) NOT NULL,
+        image TEXT NOT NULL,
+        description TEXT NOT NULL,
+        price FLOAT NOT NULL,
+        discount_price FLOAT NOT NULL,
+        quantity BIGINT NOT NULL,
+        category_id BIGINT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS baskets (
+        quantity INTEGER NOT NULL,
+        user_telegram_id BIGINT NOT NULL,
+        product_id BIGINT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_telegram_id) REFERENCES users (telegram_id),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_items (
+        quantity INTEGER NOT NULL,
+        order_id BIGINT NOT NULL,
+        user_telegram_id BIGINT NOT NULL,
+        product_id BIGINT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (order_id) REFERENCES orders (id),
+        FOREIGN KEY (user_telegram_id) REFERENCES users (telegram_id),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    """,
+)
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
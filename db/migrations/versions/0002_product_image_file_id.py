@@ -0,0 +1,6 @@
+"""Telegram file_id of each product photo, so it is sent by id instead of being uploaded again."""
+from sqlalchemy import text
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS image_file_id VARCHAR(255)"))
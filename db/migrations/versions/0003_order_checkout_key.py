@@ -0,0 +1,12 @@
+"""Idempotent checkout: one order per checkout key, enforced by a unique index."""
+from sqlalchemy import text
+
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS checkout_key VARCHAR(64)"))
+    # Same name Postgres gives the UNIQUE constraint of the model on a new database.
+    await create_index_concurrently(conn, 'orders_checkout_key_key', 'orders', 'checkout_key', unique=True)
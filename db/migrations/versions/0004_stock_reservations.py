@@ -0,0 +1,7 @@
+"""Stock held by pending orders, and until when an order holds it."""
+from sqlalchemy import text
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS reserved BIGINT NOT NULL DEFAULT 0"))
+    await conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS reserved_until TIMESTAMP WITH TIME ZONE"))
@@ -0,0 +1,36 @@
+"""Resumable admin broadcasts; at most one runs at a time (``Broadcast.start`` relies on the partial index)."""
+from sqlalchemy import text
+
+STATEMENTS = (
+    """
+    DO $$ BEGIN
+        CREATE TYPE broadcast_status AS ENUM ('RUNNING', 'DONE', 'CANCELLED');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        admin_telegram_id BIGINT NOT NULL,
+        from_chat_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        progress_message_id BIGINT,
+        status broadcast_status NOT NULL,
+        total BIGINT NOT NULL,
+        last_user_id BIGINT NOT NULL,
+        sent BIGINT NOT NULL,
+        failed BIGINT NOT NULL,
+        blocked BIGINT NOT NULL,
+        owner VARCHAR(64),
+        heartbeat_at TIMESTAMP WITH TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        id BIGSERIAL PRIMARY KEY
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_broadcasts_running ON broadcasts (status) WHERE status = 'RUNNING'",
+)
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,12 @@
+"""ISBN of each product, the key catalog imports upsert on."""
+from sqlalchemy import text
+
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS isbn VARCHAR(32)"))
+    # Same name Postgres gives the UNIQUE constraint of the model on a new database.
+    await create_index_concurrently(conn, 'products_isbn_key', 'products', 'isbn', unique=True)
@@ -0,0 +1,39 @@
+"""Sales aggregates maintained by ``db.analytics``; fill them with ``/stats rebuild`` after upgrading."""
+from sqlalchemy import text
+
+STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS daily_sales (
+        day DATE NOT NULL UNIQUE,
+        orders BIGINT NOT NULL,
+        items BIGINT NOT NULL,
+        revenue FLOAT NOT NULL,
+        id BIGSERIAL PRIMARY KEY
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_sales (
+        product_id BIGINT NOT NULL UNIQUE,
+        title VARCHAR(255) NOT NULL,
+        orders BIGINT NOT NULL,
+        items BIGINT NOT NULL,
+        revenue FLOAT NOT NULL,
+        id BIGSERIAL PRIMARY KEY
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_product_sales_revenue ON product_sales (revenue)",
+    """
+    CREATE TABLE IF NOT EXISTS category_sales (
+        category_id BIGINT NOT NULL UNIQUE,
+        name VARCHAR(255) NOT NULL,
+        items BIGINT NOT NULL,
+        revenue FLOAT NOT NULL,
+        id BIGSERIAL PRIMARY KEY
+    )
+    """,
+)
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,17 @@
+"""Indexes for the per-user and per-order lookups, built without blocking writes."""
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+INDEXES = (
+    ('ix_order_items_order_id', 'order_items', 'order_id', None),
+    ('ix_order_items_user_telegram_id', 'order_items', 'user_telegram_id', None),
+    # Also serves the keyset pagination of "my orders" (Order.get_page) without a sort.
+    ('ix_orders_user_telegram_id_created_at', 'orders', 'user_telegram_id, created_at, id', None),
+    ('ix_orders_reserved_until', 'orders', 'reserved_until', 'reserved_until IS NOT NULL'),
+)
+
+
+async def upgrade(conn):
+    for name, table, columns, where in INDEXES:
+        await create_index_concurrently(conn, name, table, columns, where=where)
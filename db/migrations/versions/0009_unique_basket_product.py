@@ -0,0 +1,52 @@
+"""One basket row per (user, product): merge the duplicates, then make the pair unique.
+
+The unique index leads with ``user_telegram_id``, so it also serves every
+basket lookup by user.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from db.migrations import create_index_concurrently, LOCK_TIMEOUT
+
+transactional = False
+
+NAME = 'uq_baskets_user_product'
+
+# One statement, so each run is atomic: the first row of every pair keeps the summed quantity.
+MERGE_DUPLICATES = """
+WITH rows AS (
+    SELECT id,
+           min(id) OVER pair AS keep,
+           sum(quantity) OVER pair AS total,
+           count(*) OVER pair AS copies
+    FROM baskets
+    WINDOW pair AS (PARTITION BY user_telegram_id, product_id)
+), merged AS (
+    UPDATE baskets SET quantity = rows.total
+    FROM rows
+    WHERE baskets.id = rows.id AND rows.id = rows.keep AND rows.copies > 1
+)
+DELETE FROM baskets USING rows
+WHERE baskets.id = rows.id AND rows.id <> rows.keep
+"""
+
+
+async def upgrade(conn):
+    for attempt in range(3):
+        result = await conn.execute(text(MERGE_DUPLICATES))
+        logging.info(f"Merged {result.rowcount} duplicate basket rows")
+        try:
+            await create_index_concurrently(conn, NAME, 'baskets', 'user_telegram_id, product_id', unique=True)
+            break
+        except IntegrityError:
+            # Workers still running the old code inserted a duplicate during the build; go again.
+            if attempt == 2:
+                raise
+
+    exists = (await conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {'name': NAME})).scalar()
+    if not exists:
+        await conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        await conn.execute(text(f"ALTER TABLE baskets ADD CONSTRAINT {NAME} UNIQUE USING INDEX {NAME}"))
+        await conn.execute(text("RESET lock_timeout"))
@@ -0,0 +1,8 @@
+"""Products of a category in id order, for the keyset-paged catalog keyboards."""
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+
+async def upgrade(conn):
+    await create_index_concurrently(conn, 'ix_products_category_id_id', 'products', 'category_id, id')
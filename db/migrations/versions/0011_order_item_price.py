@@ -0,0 +1,26 @@
+"""The unit price of each order line at the time of the order.
+
+Existing lines get their order's ``total_amount`` split in proportion to the
+current prices, so the lines of an order add up to what the customer was charged.
+Run ``/stats rebuild`` afterwards to recompute the sales aggregates from them.
+"""
+from sqlalchemy import text
+
+BACKFILL = """
+    UPDATE order_items AS item
+    SET price = CASE WHEN totals.current > 0 THEN product.price * orders.total_amount / totals.current
+                     ELSE product.price END
+    FROM products AS product, orders,
+         (SELECT line.order_id, SUM(line.quantity * line_product.price) AS current
+          FROM order_items AS line JOIN products AS line_product ON line_product.id = line.product_id
+          GROUP BY line.order_id) AS totals
+    WHERE item.price IS NULL
+      AND product.id = item.product_id
+      AND orders.id = item.order_id
+      AND totals.order_id = item.order_id
+"""
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE order_items ADD COLUMN IF NOT EXISTS price FLOAT"))
+    await conn.execute(text(BACKFILL))
@@ -1,13 +1,16 @@
+from datetime import timedelta, date
 from enum import Enum
 from typing import List
 
-from sqlalchemy import BigInteger, VARCHAR, Integer
+from sqlalchemy import BigInteger, VARCHAR, Integer, tuple_, func, literal, delete, null, update, or_
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import Float, ForeignKey, String, Text
+from sqlalchemy import Float, ForeignKey, String, Text, Date, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import mapped_column, Mapped, relationship
+from sqlalchemy.orm import mapped_column, Mapped, relationship, selectinload
 
-from db.base import TimeBaseModel
+from db.base import TimeBaseModel, TimeStamp, BaseModel
 from db.base import db
 
 
@@ -27,14 +30,57 @@ class User(TimeBaseModel):
     baskets: Mapped[List['Basket']] = relationship(back_populates='user', cascade="all, delete")
     order_items: Mapped[List['OrderItem']] = relationship(back_populates='user', cascade="all, delete")
 
+    @classmethod
+    async def recipients(cls, after_id=0, limit=1000, session: AsyncSession = None):
+        """Next ``limit`` users after ``after_id`` as ``(id, telegram_id)`` rows, in id order."""
+        query = select(cls.id, cls.telegram_id).where(cls.id > after_id).order_by(cls.id).limit(limit)
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).all()
+
+    @classmethod
+    async def count(cls, session: AsyncSession = None):
+        async with db.get_session(session) as session:
+            return (await session.execute(select(func.count()).select_from(cls))).scalar()
+
 
 class Basket(TimeBaseModel):
+    __table_args__ = (UniqueConstraint('user_telegram_id', 'product_id', name='uq_baskets_user_product'),)
+
     quantity: Mapped[int] = mapped_column(Integer, default=1)
     user_telegram_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.telegram_id'))
     user: Mapped[List['User']] = relationship(back_populates="baskets", cascade="all, delete")
     product: Mapped[List['Product']] = relationship(back_populates="baskets", cascade="all, delete")
     product_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('products.id'))
 
+    @classmethod
+    async def add(cls, user_telegram_id, product_id, quantity, session: AsyncSession = None):
+        """Put ``quantity`` copies in the basket, adding to the line the book already has."""
+        query = insert(cls).values(user_telegram_id=user_telegram_id, product_id=product_id, quantity=quantity)
+        query = query.on_conflict_do_update(
+            index_elements=['user_telegram_id', 'product_id'],
+            set_={'quantity': cls.quantity + query.excluded.quantity, 'updated_at': func.now()},
+        )
+        async with db.get_session(session) as session:
+            await session.execute(query)
+            await cls.commit(session)
+
+    @classmethod
+    async def lines(cls, user_telegram_id, session: AsyncSession = None):
+        """The user's basket as ``(title, quantity, price, line_total, total)`` rows, in one query.
+
+        ``total`` is the grand total of the basket, repeated on every row.
+        """
+        line_total = cls.quantity * Product.price
+        query = (
+            select(Product.title, cls.quantity, Product.price, line_total.label('line_total'),
+                   func.sum(line_total).over().label('total'))
+            .join(Product, Product.id == cls.product_id)
+            .where(cls.user_telegram_id == user_telegram_id)
+            .order_by(cls.id)
+        )
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).all()
+
 
 class Category(TimeBaseModel):
     name: Mapped[str] = mapped_column(VARCHAR(255))
@@ -45,21 +91,34 @@ class Category(TimeBaseModel):
 
 
 class Product(TimeBaseModel):
+    __table_args__ = (Index('ix_products_category_id_id', 'category_id', 'id'),)
+
+    isbn: Mapped[str] = mapped_column(VARCHAR(32), unique=True, nullable=True)
     title: Mapped[str] = mapped_column(VARCHAR(255))
     image: Mapped[str] = mapped_column(Text)
+    image_file_id: Mapped[str] = mapped_column(VARCHAR(255), nullable=True)
     description: Mapped[str] = mapped_column(Text)
     price: Mapped[float] = mapped_column(Float())
     discount_price: Mapped[float] = mapped_column(Float(), default=0.0)
     quantity: Mapped[int] = mapped_column(BigInteger, default=0)
+    reserved: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
     category_id: Mapped[int] = mapped_column(BigInteger, ForeignKey(Category.id, ondelete='CASCADE'))
     category: Mapped['Category'] = relationship('Category', back_populates='products')
     baskets: Mapped[List['Basket']] = relationship(back_populates='product', cascade="all, delete")
     order_items: Mapped[List['OrderItem']] = relationship(back_populates='product', cascade="all, delete")
 
     @classmethod
-    async def get_products_by_category_id(cls, category_id):
+    async def get_products_by_category_id(cls, category_id, session: AsyncSession = None):
         query = select(cls).where(cls.category_id == category_id)
-        return (await db.execute(query)).scalars()
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).scalars().all()
+
+    @classmethod
+    async def available(cls, id_, session: AsyncSession = None) -> int:
+        """Copies that can still be ordered: stock minus what pending orders hold; 0 for a missing product."""
+        query = select(cls.quantity - cls.reserved).where(cls.id == id_)
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).scalar() or 0
 
 
 class Order(TimeBaseModel):
@@ -70,24 +129,250 @@ class Order(TimeBaseModel):
         RETURNED = "⬅️ Qaytarilgan"
         CANCELLED = "❌ Bekor qilingan"
 
+    __table_args__ = (
+        Index('ix_orders_user_telegram_id_created_at', 'user_telegram_id', 'created_at', 'id'),
+        Index('ix_orders_reserved_until', 'reserved_until', postgresql_where=text('reserved_until IS NOT NULL')),
+    )
+
     user_telegram_id: Mapped[int] = mapped_column(BigInteger,ForeignKey('users.telegram_id'), nullable=False)
     phone_number: Mapped[str] = mapped_column(String(20), nullable=False)
     order_status: Mapped[Status] = mapped_column(
         SQLEnum(Status), default=Status.PENDING
     )
     total_amount: Mapped[float] = mapped_column(Float, nullable=False)
+    checkout_key: Mapped[str] = mapped_column(VARCHAR(64), unique=True, nullable=True)
+    reserved_until: Mapped[TimeStamp] = mapped_column(TimeStamp, nullable=True)
     user: Mapped["User"] = relationship('User', back_populates='orders')
     order_items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="all, delete")
 
+    @classmethod
+    async def checkout(cls, user_telegram_id, phone_number, checkout_key, reservation_ttl=0,
+                       session: AsyncSession = None):
+        """Turn the user's basket into an order in a single transaction.
+
+        The order total is computed in SQL, the items are copied with INSERT ... SELECT
+        and the basket is cleared, whatever the number of basket rows. A repeated
+        ``checkout_key`` creates nothing and returns the first order. With a
+        ``reservation_ttl`` the stock is reserved for that many seconds, or
+        ``OutOfStockError`` is raised and nothing is written. Returns
+        ``(order, lines, created)``; ``order`` is None when the basket is empty and
+        ``lines`` are the ``(title, quantity, price, line_total)`` of the new items,
+        empty unless ``created``.
+        """
+        from db.inventory import reserve_stock
+
+        reserved_until = func.now() + timedelta(seconds=reservation_ttl) if reservation_ttl else null()
+        in_basket = Basket.user_telegram_id == user_telegram_id
+        order_insert = (
+            insert(cls)
+            .from_select(
+                ['user_telegram_id', 'phone_number', 'total_amount', 'order_status', 'checkout_key', 'reserved_until'],
+                select(
+                    literal(user_telegram_id, BigInteger),
+                    literal(phone_number, String),
+                    func.sum(Basket.quantity * Product.price),
+                    literal(cls.Status.PENDING, cls.__table__.c.order_status.type),
+                    literal(checkout_key, VARCHAR),
+                    reserved_until,
+                )
+                .select_from(Basket)
+                .join(Product, Product.id == Basket.product_id)
+                .where(in_basket)
+                .having(func.count() > 0)
+            )
+            .on_conflict_do_nothing(index_elements=['checkout_key'])
+            .returning(cls.id, cls.created_at, cls.order_status, cls.total_amount)
+        )
+        async with db.get_session(session) as session:
+            try:
+                order = (await session.execute(order_insert)).first()
+                if order is None:
+                    await session.rollback()
+                    query = select(cls.id, cls.created_at, cls.order_status, cls.total_amount) \
+                        .where(cls.checkout_key == checkout_key)
+                    return (await session.execute(query)).first(), [], False
+
+                items = (
+                    insert(OrderItem).from_select(
+                        ['quantity', 'price', 'order_id', 'user_telegram_id', 'product_id'],
+                        select(Basket.quantity, Product.price, literal(order.id, BigInteger), Basket.user_telegram_id,
+                               Basket.product_id).join(Product, Product.id == Basket.product_id).where(in_basket)
+                    )
+                    .returning(OrderItem.id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+                    .cte('items')
+                )
+                lines = (await session.execute(
+                    select(Product.title, items.c.quantity, items.c.price,
+                           (items.c.quantity * items.c.price).label('line_total'))
+                    .join(items, items.c.product_id == Product.id)
+                    .order_by(items.c.id)
+                )).all()
+                if reservation_ttl:
+                    await reserve_stock(session, order.id)
+                await session.execute(delete(Basket).where(in_basket))
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        return order, lines, True
+
+    @classmethod
+    async def get_page(cls, user_telegram_id, cursor=None, newer=False, limit=5, session: AsyncSession = None):
+        """One page of a user's orders, newest first, keyset-paginated on (created_at, id).
+
+        ``cursor`` is the (created_at, id) of the first (``newer``) or last order of the
+        page currently shown. Returns ``(orders, has_older, has_newer)``.
+        """
+        query = (
+            select(cls)
+            .options(selectinload(cls.order_items).selectinload(OrderItem.product))
+            .where(cls.user_telegram_id == user_telegram_id)
+        )
+        if cursor and newer:
+            query = query.where(tuple_(cls.created_at, cls.id) > tuple(cursor)).order_by(cls.created_at, cls.id)
+        else:
+            if cursor:
+                query = query.where(tuple_(cls.created_at, cls.id) < tuple(cursor))
+            query = query.order_by(cls.created_at.desc(), cls.id.desc())
+
+        async with db.get_session(session) as session:
+            orders = (await session.execute(query.limit(limit + 1))).scalars().all()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        if cursor and newer:
+            return orders[::-1], True, has_more
+        return orders, has_more, cursor is not None
+
 
 class OrderItem(TimeBaseModel):
     quantity: Mapped[int] = mapped_column(Integer, default=1)
+    # Product.price when the order was placed; later price changes do not touch past orders.
+    price: Mapped[float] = mapped_column(Float(), nullable=True)
 
-    order_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('orders.id'))
+    order_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('orders.id'), index=True)
     order: Mapped["Order"] = relationship(back_populates='order_items', cascade="all, delete")
 
-    user_telegram_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.telegram_id'))
+    user_telegram_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.telegram_id'), index=True)
     user: Mapped["User"] = relationship(back_populates="order_items", cascade="all, delete")
 
     product: Mapped["Product"] = relationship(back_populates="order_items", cascade="all, delete")
     product_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('products.id'))
+
+
+class Broadcast(TimeBaseModel):
+    """An admin announcement copied to every user, with the progress needed to resume it.
+
+    Users are walked in ``users.id`` order and ``last_user_id`` is the highest id
+    below which every user has been handled. The worker sending it holds a lease
+    (``owner`` + ``heartbeat_at``); when the heartbeat gets old another worker
+    takes the broadcast over and continues after ``last_user_id``.
+    """
+
+    class Status(Enum):
+        RUNNING = "running"
+        DONE = "done"
+        CANCELLED = "cancelled"
+
+    # At most one running broadcast, so two admins starting at once cannot both win.
+    __table_args__ = (
+        Index('uq_broadcasts_running', 'status', unique=True, postgresql_where=text("status = 'RUNNING'")),
+    )
+
+    admin_telegram_id: Mapped[int] = mapped_column(BigInteger)
+    from_chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int] = mapped_column(BigInteger)
+    progress_message_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    # Named apart from Order.Status, which already owns the Postgres type "status".
+    status: Mapped[Status] = mapped_column(SQLEnum(Status, name='broadcast_status'), default=Status.RUNNING)
+    total: Mapped[int] = mapped_column(BigInteger, default=0)
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    sent: Mapped[int] = mapped_column(BigInteger, default=0)
+    failed: Mapped[int] = mapped_column(BigInteger, default=0)
+    blocked: Mapped[int] = mapped_column(BigInteger, default=0)
+    owner: Mapped[str] = mapped_column(VARCHAR(64), nullable=True)
+    heartbeat_at: Mapped[TimeStamp] = mapped_column(TimeStamp, nullable=True)
+
+    @classmethod
+    async def start(cls, owner, session: AsyncSession = None, **kwargs):
+        """Insert a running broadcast leased to ``owner``; returns it, or None when another one is running."""
+        query = (
+            insert(cls)
+            .values(owner=owner, heartbeat_at=func.now(), status=cls.Status.RUNNING, **kwargs)
+            .on_conflict_do_nothing(index_elements=['status'], index_where=text("status = 'RUNNING'"))
+            .returning(cls)
+        )
+        async with db.get_session(session) as session:
+            broadcast = (await session.execute(query)).scalar()
+            await cls.commit(session)
+            return broadcast
+
+    @classmethod
+    async def claim(cls, owner, lease, session: AsyncSession = None):
+        """Take the lease of a running broadcast whose owner stopped heart-beating; returns it or None."""
+        query = (
+            update(cls)
+            .where(cls.status == cls.Status.RUNNING,
+                   or_(cls.heartbeat_at.is_(None), cls.heartbeat_at < func.now() - timedelta(seconds=lease)))
+            .values(owner=owner, heartbeat_at=func.now())
+            .returning(cls)
+        )
+        stale = select(cls.id).where(query.whereclause).order_by(cls.id).limit(1) \
+            .with_for_update(skip_locked=True).scalar_subquery()
+        query = query.where(cls.id == stale)
+        async with db.get_session(session) as session:
+            broadcast = (await session.execute(query)).scalar()
+            await cls.commit(session)
+            return broadcast
+
+    @classmethod
+    async def checkpoint(cls, id_, owner, session: AsyncSession = None, **progress):
+        """Save progress and renew the lease; returns the current status, None when the lease was lost."""
+        query = (
+            update(cls)
+            .where(cls.id == id_, cls.owner == owner)
+            .values({'heartbeat_at': func.now(), **progress})
+            .returning(cls.status)
+        )
+        async with db.get_session(session) as session:
+            status = (await session.execute(query)).scalar()
+            await cls.commit(session)
+            return status
+
+    @classmethod
+    async def get_running(cls, session: AsyncSession = None):
+        query = select(cls).where(cls.status == cls.Status.RUNNING).order_by(cls.id).limit(1)
+        async with db.get_session(session) as session:
+            return (await session.execute(query)).scalar()
+
+    @classmethod
+    async def cancel(cls, id_, session: AsyncSession = None):
+        query = update(cls).where(cls.id == id_, cls.status == cls.Status.RUNNING) \
+            .values(status=cls.Status.CANCELLED).returning(cls.id)
+        async with db.get_session(session) as session:
+            cancelled = (await session.execute(query)).scalar()
+            await cls.commit(session)
+            return cancelled is not None
+
+
+class DailySale(BaseModel):
+    """Accepted orders per (Tashkent) day of ordering; maintained by ``db.analytics``."""
+    day: Mapped[date] = mapped_column(Date, unique=True)
+    orders: Mapped[int] = mapped_column(BigInteger, default=0)
+    items: Mapped[int] = mapped_column(BigInteger, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class ProductSale(BaseModel):
+    """Sold copies and revenue per product; the title is kept so deleted books still show up."""
+    product_id: Mapped[int] = mapped_column(BigInteger, unique=True)
+    title: Mapped[str] = mapped_column(VARCHAR(255))
+    orders: Mapped[int] = mapped_column(BigInteger, default=0)
+    items: Mapped[int] = mapped_column(BigInteger, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0, index=True)
+
+
+class CategorySale(BaseModel):
+    category_id: Mapped[int] = mapped_column(BigInteger, unique=True)
+    name: Mapped[str] = mapped_column(VARCHAR(255))
+    items: Mapped[int] = mapped_column(BigInteger, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 
@@ -6,71 +7,180 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
 from aiogram.utils.i18n import I18n, FSMI18nMiddleware
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from aiohttp import web
 
 from bot.config import TOKEN
+from bot.inlinemode import search_index
+from bot.middlewares import DatabaseSessionMiddleware, ColdStartMiddleware
+from bot.utils.admins import admin_registry
+from bot.utils.broadcast import broadcasts
+from bot.utils.catalog import catalog
+from bot.utils.http import close_http_session
+from bot.utils.intents import intents
+from bot.utils.invalidation import invalidation_bus
+from bot.utils.media import media_store
+from bot.utils.periodic import run_periodically
+from bot.utils.redis_client import close_redis
+from bot.utils.registrar import registrar
+from bot.utils.server import QueuedRequestHandler, Supervisor, serve_app
+from bot.utils.storage import create_storage
+from bot.utils.thumbnails import thumbnails
 from bot.utils.starter import router
+from bot.utils.startup import startup, fingerprint, stored_fingerprint, store_fingerprint
+from config import conf
 from db import database
+from db.inventory import release_expired_reservations
+from db.migrations import ensure_current
 
-dp = Dispatcher()
-WEB_SERVER_HOST = "127.0.0.1"
-WEB_SERVER_PORT = 8080  # Changed from 80 to 8080
+dp = Dispatcher(storage=create_storage())
+WEB_SERVER_HOST = conf.bot.WEB_SERVER_HOST or "127.0.0.1"
+WEB_SERVER_PORT = conf.bot.WEB_SERVER_PORT
 WEBHOOK_PATH = "/webhook"
-BASE_WEBHOOK_URL = "https://jasur.fil.uz"
+BASE_WEBHOOK_URL = conf.bot.BASE_WEBHOOK_URL
+background_tasks = set()
 
 
-async def on_startup(bot: Bot):
-    logging.info("Starting up...")
-    # Initialize database
-    await database.create_all()
-
-    # Set bot commands
-    command_list = [
-        BotCommand(command='start', description='Start the bot 🪡'),
-        BotCommand(command='help', description='Help 🔓'),
-        BotCommand(command='language', description='Change language 🔄')
-    ]
-    await bot.set_my_commands(command_list)
-
-    # Check current webhook status
+COMMANDS = [
+    BotCommand(command='start', description='Start the bot 🪡'),
+    BotCommand(command='help', description='Help 🔓'),
+    BotCommand(command='language', description='Change language 🔄')
+]
+
+
+async def ensure_webhook(bot: Bot, url: str) -> bool:
     try:
         current_webhook = await bot.get_webhook_info()
-        expected_webhook_url = f"{BASE_WEBHOOK_URL}{WEBHOOK_PATH}"
-
-        if current_webhook.url != expected_webhook_url:
+        if current_webhook.url != url:
             logging.info("Setting webhook...")
-            await bot.set_webhook(expected_webhook_url)
+            await bot.set_webhook(url)
         else:
             logging.info("Webhook already set.")
+        return True
     except Exception as e:
         logging.error(f"Failed to set webhook: {e}")
+        return False
+
+
+async def set_commands(bot: Bot):
+    """Send the command menu unless the stored fingerprint shows Telegram already has exactly this one."""
+    expected = fingerprint([command.model_dump() for command in COMMANDS])
+    if await stored_fingerprint(bot.id) == expected:
+        logging.info("Bot commands unchanged, skipping")
+        return
+    await bot.set_my_commands(COMMANDS)
+    await store_fingerprint(bot.id, expected)
+
+
+async def prepare(bot: Bot):
+    """Deploy-time work done once, not in every worker: schema check, commands and webhook.
+
+    The webhook is always checked, it can be removed outside a deploy; the
+    commands are only sent when they changed since the last successful start.
+    """
+    logging.info("Preparing...")
+    # The schema is migrated by `make migrate` at deploy; refuse to serve on an outdated one.
+    await startup.run(schema=ensure_current(), commands=set_commands(bot),
+                      webhook=ensure_webhook(bot, f"{BASE_WEBHOOK_URL}{WEBHOOK_PATH}"))
+
+
+async def on_startup(bot: Bot, prepare_once: bool = False):
+    logging.info("Starting up...")
+    if prepare_once:
+        await prepare(bot)
+    # Independent loads run side by side; the caches are warm before the server starts listening.
+    await startup.run(
+        pool=database.warm(conf.db.POOL_WARM),
+        search_index=search_index.load(),
+        admins=admin_registry.load(),
+        users=registrar.load(),
+        catalog=catalog.category_rows(),
+        invalidation=invalidation_bus.start(),
+    )
+    logging.info("Search index loaded: %s products", len(search_index))
+    logging.info("Known users: %s", len(registrar))
+    background_tasks.add(asyncio.create_task(
+        run_periodically(admin_registry.load, conf.bot.ADMIN_REFRESH_INTERVAL)))
+    if conf.bot.STOCK_RESERVATION_TTL:
+        background_tasks.add(asyncio.create_task(run_periodically(release_expired_reservations, 30)))
+    background_tasks.add(asyncio.create_task(run_periodically(media_store.collect, conf.bot.MEDIA_GC_INTERVAL)))
+    await startup.step('broadcasts', broadcasts.resume(bot))
+    background_tasks.add(asyncio.create_task(run_periodically(broadcasts.resume, 30, bot)))
+    startup.mark_ready()
 
 
 async def on_shutdown(bot: Bot):
-    await bot.delete_my_commands()
+    startup.mark_draining()
+    for task in background_tasks:
+        task.cancel()
+    await broadcasts.stop()
+    await registrar.close()
+    await invalidation_bus.stop()
+    await close_http_session()
+    media_store.close()
+    await close_redis()
+    await database.dispose()
 
 
-def main() -> None:
+def create_bot() -> Bot:
+    return Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+
+def create_app(bot: Bot, prepare_once=False) -> web.Application:
     i18n = I18n(path="locales")
+    intents.build(i18n)
+    dp.update.outer_middleware.register(DatabaseSessionMiddleware())
     dp.update.outer_middleware.register(FSMI18nMiddleware(i18n))
+    dp.update.outer_middleware.register(ColdStartMiddleware())
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    invalidation_bus.subscribe('catalog', catalog.on_invalidate)
+    invalidation_bus.subscribe('catalog', search_index.on_invalidate)
+    invalidation_bus.subscribe('admins', admin_registry.on_invalidate)
 
     dp.include_router(router)
-    dp.startup.register(on_startup)
-    bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     app = web.Application()
 
-    webhook_requests_handler = SimpleRequestHandler(
+    webhook_requests_handler = QueuedRequestHandler(
         dispatcher=dp,
         bot=bot,
+        workers=conf.bot.UPDATE_WORKERS,
+        max_size=conf.bot.UPDATE_QUEUE_SIZE,
+        shutdown_timeout=conf.bot.SHUTDOWN_TIMEOUT,
+        stats_token=conf.bot.STATS_TOKEN,
     )
     webhook_requests_handler.register(app, path=WEBHOOK_PATH)
+    thumbnails.register(app)
+    startup.register(app)
+
+    setup_application(app, dp, bot=bot, prepare_once=prepare_once)
+    return app
+
+
+async def run_once(step):
+    bot = create_bot()
+    try:
+        await step(bot)
+    finally:
+        await bot.session.close()
+        await database.dispose()
+
+
+def run_worker(ready=None) -> None:
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    app = create_app(create_bot())
+    asyncio.run(serve_app(app, WEB_SERVER_HOST, WEB_SERVER_PORT, conf.bot.SHUTDOWN_TIMEOUT,
+                          reuse_port=True, ready=ready, on_stop=startup.mark_draining,
+                          stop_grace=conf.bot.READY_GRACE))
 
-    setup_application(app, dp, bot=bot)
 
-    web.run_app(app, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT)
+def main() -> None:
+    if conf.bot.WORKERS > 1:
+        asyncio.run(run_once(prepare))
+        Supervisor(run_worker, conf.bot.WORKERS, conf.bot.SHUTDOWN_TIMEOUT + conf.bot.READY_GRACE).run()
+    else:
+        app = create_app(create_bot(), prepare_once=True)
+        web.run_app(app, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT, shutdown_timeout=conf.bot.SHUTDOWN_TIMEOUT)
 
 
 if __name__ == "__main__":
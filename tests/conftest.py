@@ -0,0 +1,4 @@
+import os
+
+# config.py builds the database URL at import time; no connection is made by these tests.
+os.environ.setdefault('DB_PORT', '5432')
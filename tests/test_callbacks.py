@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from bot.utils import callbacks as schema
+from bot.utils.callbacks import CallbackRouter, legacy_callback
+
+BIG = 2 ** 63 - 1
+
+SAMPLES = [
+    schema.Language(code='uz'),
+    schema.CategoriesPage(cursor=BIG, back=True),
+    schema.CategoryOpen(id=BIG),
+    schema.ProductsPage(category_id=BIG, cursor=BIG, back=False),
+    schema.ProductOpen(id=BIG),
+    schema.CountChange(product_id=BIG, delta=-1),
+    schema.Noop(),
+    schema.AddToBasket(product_id=BIG, quantity=999),
+    schema.BackToCategories(),
+    schema.ShowCategories(),
+    schema.ShowBasket(),
+    schema.ClearBasket(),
+    schema.Checkout(),
+    schema.CancelCheckout(),
+    schema.PlaceOrder(phone='+998901234567'),
+    schema.AdminOrder(accept=True, user_id=BIG, order_id=BIG),
+    schema.OrdersPage(newer=True, micros=BIG, order_id=BIG),
+    schema.AdminPage(kind=schema.AdminList.DELETE_PRODUCT, cursor=BIG, back=True),
+    schema.PickCategory(id=BIG),
+    schema.DeleteCategory(id=BIG),
+    schema.DeleteProduct(id=BIG),
+    schema.BroadcastConfirm(send=False),
+    schema.BroadcastStop(id=BIG),
+]
+
+
+@pytest.mark.parametrize('data', SAMPLES, ids=lambda data: type(data).__name__)
+def test_round_trip_within_telegram_limit(data):
+    packed = data.pack()
+    assert len(packed.encode()) <= 64
+    assert type(data).unpack(packed) == data
+
+
+def test_prefixes_are_unique():
+    prefixes = [type(data).__prefix__ for data in SAMPLES]
+    assert len(prefixes) == len(set(prefixes))
+
+
+@pytest.mark.parametrize('legacy, expected', [
+    ('savat', schema.ShowBasket()),
+    ('lang_uz', schema.Language(code='uz')),
+    ('category_name_12', schema.CategoryOpen(id=12)),
+    ('product_name_34', schema.ProductOpen(id=34)),
+    ('add_to_card_7_2', schema.AddToBasket(product_id=7, quantity=2)),
+    ('change-7', schema.CountChange(product_id=7, delta=-1)),
+    ('change+7', schema.CountChange(product_id=7, delta=1)),
+    ('confirm_order_+998901234567', schema.PlaceOrder(phone='+998901234567')),
+    ('from_admin_order_accept-5-5-9', schema.AdminOrder(accept=True, user_id=5, order_id=9)),
+    ('from_admin_canceled_order-5-5-9', schema.AdminOrder(accept=False, user_id=5, order_id=9)),
+])
+def test_legacy_payloads(legacy, expected):
+    assert legacy_callback(legacy) == expected
+
+
+@pytest.mark.parametrize('legacy', ['unknown', 'category_name_x', 'change+x', '',
+                                    # never released, only the typed buttons were
+                                    'categories_p_20', 'orders_newer_1_9', 'broadcast_stop_4', 'broadcast_abort'])
+def test_unknown_or_malformed_legacy_payloads(legacy):
+    assert legacy_callback(legacy) is None
+
+
+def callback_update(data, user_id=1):
+    return Update.model_validate({
+        'update_id': 1,
+        'callback_query': {
+            'id': '1',
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Test'},
+            'chat_instance': '1',
+            'data': data,
+        },
+    })
+
+
+def run_router(*datas):
+    router = CallbackRouter()
+    calls = []
+
+    @router.handler(schema.ProductOpen, lambda callback: callback.from_user.id == 2)
+    async def only_user_two(callback, callback_data):
+        calls.append(('user two', callback_data))
+
+    @router.handler(schema.ProductOpen)
+    async def product_open(callback, callback_data):
+        calls.append(('product', callback_data))
+
+    @router.handler(schema.ShowBasket)
+    async def show_basket(callback, callback_data):
+        calls.append(('basket', callback_data))
+
+    async def main():
+        dp = Dispatcher()
+        dp.include_router(router.router)
+        bot = Bot('123:abc')
+        try:
+            for data, user_id in datas:
+                await dp.feed_update(bot, callback_update(data, user_id))
+        finally:
+            await bot.session.close()
+
+    asyncio.run(main())
+    return calls
+
+
+def test_router_dispatches_on_prefix_and_checks_filters():
+    calls = run_router((schema.ProductOpen(id=5).pack(), 1), (schema.ProductOpen(id=6).pack(), 2),
+                       (schema.ShowBasket().pack(), 1))
+    assert calls == [('product', schema.ProductOpen(id=5)), ('user two', schema.ProductOpen(id=6)),
+                     ('basket', schema.ShowBasket())]
+
+
+def test_router_converts_legacy_and_ignores_unknown():
+    calls = run_router(('product_name_34', 1), ('savat', 1), ('nothing', 1),
+                       (schema.ClearBasket().pack(), 1), ('p1:not-a-number', 1))
+    assert calls == [('product', schema.ProductOpen(id=34)), ('basket', schema.ShowBasket())]
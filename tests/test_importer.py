@@ -0,0 +1,34 @@
+import pytest
+
+from bot.admins.importer import detect_encoding, open_document, read_rows
+
+
+def rows_of(tmp_path, name, data: bytes):
+    path = tmp_path / name
+    path.write_bytes(data)
+    encoding = detect_encoding(str(path))
+    with open_document(str(path), encoding) as file:
+        return encoding, list(read_rows(file, name))
+
+
+@pytest.mark.parametrize('encoding, data', [
+    ('utf-8-sig', '\ufeffisbn;title\n1;Ўткан кунлар\n'.encode()),
+    ('utf-8-sig', 'isbn;title\r\n1;Ўткан кунлар\r\n'.encode()),
+    ('cp1251', 'isbn;title\n1;Ўткан кунлар\n'.encode('cp1251')),
+])
+def test_csv_encodings(tmp_path, encoding, data):
+    assert rows_of(tmp_path, 'books.csv', data) == (encoding, [(2, {'isbn': '1', 'title': 'Ўткан кунлар'})])
+
+
+def test_utf8_split_across_chunks_is_still_utf8(tmp_path, monkeypatch):
+    monkeypatch.setattr('bot.admins.importer.READ_CHUNK', 3)
+    encoding, rows = rows_of(tmp_path, 'books.csv', 'isbn,title\n1,ЎЎЎЎ\n'.encode())
+    assert encoding == 'utf-8-sig'
+    assert rows[0][1]['title'] == 'ЎЎЎЎ'
+
+
+def test_json_lines(tmp_path):
+    encoding, rows = rows_of(tmp_path, 'books.jsonl', b'{"isbn": "1"}\n\n[1]\n{"isbn": "2"\n')
+    assert rows[0] == (1, {'isbn': '1'})
+    assert [line_no for line_no, _ in rows] == [1, 3, 4]
+    assert all(isinstance(row, ValueError) for _, row in rows[1:])
@@ -0,0 +1,77 @@
+from bot.inlinemode.search_index import IndexedProduct, SearchIndex, normalize, trigrams
+
+
+def product(id_, title, description='', category_id=1):
+    return IndexedProduct(id_, title, description, 10.0, category_id, '')
+
+
+def make_index(*products):
+    index = SearchIndex()
+    for item in products:
+        index.add(item)
+    return index
+
+
+def ids(results):
+    return [item.id for item in results]
+
+
+def test_normalize_unifies_case_apostrophes_and_punctuation():
+    assert normalize("O‘zbek  Tili!") == "o'zbek tili"
+    assert normalize("O`zbek, tili") == "o'zbek tili"
+    assert normalize(None) == ''
+
+
+def test_trigrams():
+    assert trigrams('abcd') == {'abc', 'bcd'}
+    assert trigrams('ab') == set()
+
+
+def test_ranking_order():
+    index = make_index(
+        product(1, 'Python'),
+        product(2, 'Python Crash Course'),
+        product(3, 'Learning Python'),
+        product(4, 'Monty Pythonic'),
+        product(5, 'Cookbook', 'recipes in python'),
+        product(6, 'Java'),
+    )
+    assert ids(index.search('python')) == [1, 2, 3, 4, 5]
+
+
+def test_substring_inside_a_word():
+    index = make_index(product(1, 'Jinoyat va jazo'), product(2, 'Alkimyogar'))
+    assert ids(index.search('noya')) == [1]
+
+
+def test_every_query_word_must_prefix_a_token():
+    index = make_index(product(1, 'Clean Code'), product(2, 'Clean Architecture'), product(3, 'Code Complete'))
+    assert ids(index.search('cle cod')) == [1]
+    assert ids(index.search('clean')) == [2, 1]
+
+
+def test_limit_keeps_the_best_ranked():
+    index = make_index(*(product(i, f'Book {i:02}') for i in range(1, 21)), product(99, 'Notebook'))
+    assert ids(index.search('book', limit=3)) == [1, 2, 3]
+    assert ids(index.search('noteb', limit=3)) == [99]
+
+
+def test_empty_query_lists_titles_alphabetically():
+    index = make_index(product(1, 'Zamon'), product(2, 'Alpomish'), product(3, 'Kecha va kunduz'))
+    assert ids(index.search('')) == [2, 3, 1]
+    assert ids(index.search('', limit=2)) == [2, 3]
+
+
+def test_update_and_remove():
+    index = make_index(product(1, 'Old title'), product(2, 'Other', category_id=2))
+    index.add(product(1, 'New title'))
+    assert ids(index.search('old')) == []
+    assert ids(index.search('new')) == [1]
+
+    index.remove(1)
+    assert ids(index.search('title')) == []
+    assert 1 not in index
+
+    index.remove_category(2)
+    assert len(index) == 0
+    assert ids(index.search('oth')) == []
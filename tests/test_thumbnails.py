@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from bot.utils.thumbnails import ThumbnailServer
+
+
+def serve(server, path):
+    request = make_mocked_request('GET', path, match_info={'product_id': path.split('/')[-1].split('.')[0]})
+    try:
+        return asyncio.run(server.handle(request))
+    except web.HTTPNotFound as e:
+        return e
+
+
+def test_new_version_is_not_served_from_the_cache():
+    server = ThumbnailServer()
+    images = {'a': ('"a"', b'old'), 'b': ('"b"', b'new')}
+    current = ['a']
+    loads = []
+
+    async def load(product_id):
+        loads.append(product_id)
+        return images[current[0]]
+
+    server.load = load
+    assert serve(server, '/thumbs/1.jpg?v=a').body == b'old'
+    assert serve(server, '/thumbs/1.jpg?v=a').body == b'old'
+    current[0] = 'b'
+    response = serve(server, '/thumbs/1.jpg?v=b')
+    assert response.body == b'new'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert loads == [1, 1]
+
+
+@pytest.mark.parametrize('path', ['/thumbs/2.jpg', '/thumbs/2.jpg?v=x'])
+def test_misses_and_unversioned_urls_are_cached_briefly(path):
+    server = ThumbnailServer(short_ttl=0)
+    entries = [None, ('"a"', b'image')]
+
+    async def load(product_id):
+        return entries.pop(0)
+
+    server.load = load
+    assert serve(server, path).status == 404
+    assert serve(server, path).status == 200
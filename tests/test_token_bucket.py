@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from bot.utils.broadcast import TokenBucket
+
+
+async def timed(coroutine):
+    started = time.monotonic()
+    await coroutine
+    return time.monotonic() - started
+
+
+async def acquire(bucket, times):
+    for _ in range(times):
+        await bucket.acquire()
+
+
+def test_paces_to_rate():
+    bucket = TokenBucket(rate=100)
+    elapsed = asyncio.run(timed(acquire(bucket, 11)))
+    # The first token is there from the start, the other ten take 1/rate each.
+    assert 0.09 <= elapsed < 0.3
+
+
+def test_pause_holds_every_sender():
+    async def main():
+        bucket = TokenBucket(rate=1000)
+        await bucket.acquire()
+        bucket.pause(0.1)
+        return await asyncio.gather(timed(bucket.acquire()), timed(bucket.acquire()))
+
+    first, second = asyncio.run(main())
+    assert first >= 0.1
+    assert second >= 0.1
+
+
+def test_pause_drops_saved_tokens():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=5)
+        await asyncio.sleep(0.3)  # would refill the burst
+        bucket.pause(0.05)
+        return await timed(acquire(bucket, 2))
+
+    # After the pause the bucket starts empty: the second token needs another 1/rate.
+    assert asyncio.run(main()) >= 0.05 + 0.04
+
+
+def test_pause_never_shortens_a_longer_pause():
+    async def main():
+        bucket = TokenBucket(rate=1000)
+        bucket.pause(0.15)
+        bucket.pause(0.01)
+        return await timed(bucket.acquire())
+
+    assert asyncio.run(main()) >= 0.14
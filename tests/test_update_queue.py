@@ -0,0 +1,119 @@
+import asyncio
+
+from bot.utils.update_queue import UpdateQueue, update_key
+
+
+def test_update_key():
+    assert update_key({'update_id': 1, 'message': {'from': {'id': 7}, 'chat': {'id': -100}}}) == 7
+    assert update_key({'update_id': 2, 'inline_query': {'from': {'id': 8}}}) == 8
+    assert update_key({'update_id': 3, 'channel_post': {'chat': {'id': -100}}}) == -100
+    assert update_key({'update_id': 4, 'poll': {'id': 'x'}}) == ('update', 4)
+
+
+def test_updates_of_one_user_are_handled_in_order_others_in_parallel():
+    handled = []
+    running = set()
+    overlapping = []
+
+    async def handler(item):
+        user, n = item
+        assert user not in running, "two updates of one user ran at once"
+        running.add(user)
+        overlapping.append(len(running))
+        await asyncio.sleep(0.001 * (n % 3))
+        handled.append(item)
+        running.discard(user)
+
+    async def main():
+        queue = UpdateQueue(handler, workers=4, max_size=1000)
+        for n in range(30):
+            for user in ('a', 'b', 'c'):
+                await queue.put(user, (user, n))
+        assert await queue.join(5)
+        await queue.close()
+
+    asyncio.run(main())
+    for user in ('a', 'b', 'c'):
+        assert [n for u, n in handled if u == user] == list(range(30))
+    assert max(overlapping) > 1
+
+
+def test_close_drains_queued_updates():
+    handled = []
+
+    async def handler(item):
+        await asyncio.sleep(0.001)
+        handled.append(item)
+
+    async def main():
+        queue = UpdateQueue(handler, workers=2, max_size=100)
+        for n in range(20):
+            await queue.put(n % 5, n)
+        await queue.close(timeout=5)
+        return queue
+
+    queue = asyncio.run(main())
+    assert sorted(handled) == list(range(20))
+    assert queue.depth == 0
+    assert queue.stats()['workers'] == 0
+
+
+def test_close_gives_up_after_timeout(caplog):
+    release = None
+
+    async def handler(item):
+        await release.wait()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        queue = UpdateQueue(handler, workers=1, max_size=10)
+        await queue.put('a', 1)
+        await queue.put('a', 2)
+        await queue.close(timeout=0.05)
+        return queue
+
+    queue = asyncio.run(main())
+    assert "closed with 2 unhandled updates" in caplog.text
+    # The in-flight update was cancelled, the one queued behind it never started.
+    assert queue.depth == 1
+
+
+def test_failing_update_does_not_stop_the_user():
+    handled = []
+
+    async def handler(item):
+        if item == 1:
+            raise RuntimeError("boom")
+        handled.append(item)
+
+    async def main():
+        queue = UpdateQueue(handler, workers=1, max_size=10)
+        for n in range(3):
+            await queue.put('a', n)
+        await queue.close(timeout=5)
+
+    asyncio.run(main())
+    assert handled == [0, 2]
+
+
+def test_put_blocks_when_full():
+    release = None
+
+    async def handler(item):
+        await release.wait()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        queue = UpdateQueue(handler, workers=1, max_size=2)
+        await queue.put('a', 1)
+        await queue.put('b', 2)
+        blocked = asyncio.create_task(queue.put('c', 3))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await queue.close(timeout=5)
+
+    asyncio.run(main())